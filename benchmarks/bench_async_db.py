@@ -0,0 +1,172 @@
+# bench_async_db.py
+"""
+Concurrency benchmark for the sync vs async database paths
+
+Runs an open-loop mixed read/write workload of concurrent coroutines, the
+way the API routes see it, once through the blocking Session helpers in
+sync_db.py ("sync", the old route behaviour) and once through the
+AsyncSession helpers ("async").
+Reports p50/p95/p99 latency per operation plus event-loop lag as JSON.
+
+Usage:
+    python benchmarks/bench_async_db.py --rate 300 --ops 2000 --write-ratio 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+DB_DIR = tempfile.mkdtemp(prefix="autoforms-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(DB_DIR, 'bench.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import engine, async_engine, SessionLocal, AsyncSessionLocal, QuizCreate, Question  # noqa: E402
+import helpers  # noqa: E402
+import sync_db  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies):
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def sample_quiz(i):
+    return QuizCreate(
+        title=f"Benchmark quiz {i}",
+        description="Generated by bench_async_db",
+        questions=[
+            Question(text=f"Question {n}", options=["A", "B", "C", "D"], correct_answer_index=n % 4)
+            for n in range(10)
+        ],
+    )
+
+
+async def sync_op(kind, quiz_ids, i):
+    # Mirrors the old routes: blocking Session calls inside an async handler
+    db = SessionLocal()
+    try:
+        if kind == "write":
+            quiz_ids.append(sync_db.create_quiz_in_db(db, sample_quiz(i)).id)
+        elif kind == "get":
+            sync_db.get_quiz_by_id(db, random.choice(quiz_ids))
+        else:
+            sync_db.get_quizzes_page(db, limit=20)
+    finally:
+        db.close()
+
+
+async def async_op(kind, quiz_ids, i):
+    async with AsyncSessionLocal() as db:
+        if kind == "write":
+            quiz_ids.append((await helpers.create_quiz_in_db_async(db, sample_quiz(i))).id)
+        elif kind == "get":
+            await helpers.get_quiz_by_id_async(db, random.choice(quiz_ids))
+        else:
+            await helpers.get_quizzes_page_async(db, limit=20)
+
+
+async def measure_loop_lag(stop, lags, interval=0.005):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run_mode(mode, rate, total_ops, write_ratio, seed_ids):
+    """
+    Open-loop run: operations arrive at a fixed rate regardless of how fast
+    earlier ones finish, and latency is measured from the scheduled arrival
+    time, so time spent waiting behind a blocked event loop is counted.
+    """
+    op = sync_op if mode == "sync" else async_op
+    latencies = {"write": [], "get": [], "list": []}
+    errors = 0
+    quiz_ids = list(seed_ids)
+    rng = random.Random(42)
+
+    async def request(kind, i, arrival):
+        nonlocal errors
+        try:
+            await op(kind, quiz_ids, i)
+        except Exception:
+            errors += 1
+            return
+        latencies[kind].append(time.perf_counter() - arrival)
+
+    stop = asyncio.Event()
+    lags = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+    tasks = []
+    started = time.perf_counter()
+    for i in range(total_ops):
+        arrival = started + i / rate
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        roll = rng.random()
+        kind = "write" if roll < write_ratio else ("get" if roll < (1 + write_ratio) / 2 else "list")
+        tasks.append(asyncio.create_task(request(kind, i, arrival)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+    await async_engine.dispose()
+
+    all_latencies = [v for values in latencies.values() for v in values]
+    return {
+        "mode": mode,
+        "wall_time_s": round(elapsed, 3),
+        "throughput_ops_s": round(len(all_latencies) / elapsed, 1),
+        "errors": errors,
+        "overall": summarize(all_latencies),
+        "per_operation": {kind: summarize(values) for kind, values in latencies.items() if values},
+        "event_loop_lag": summarize(lags) if lags else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=300, help="Operation arrival rate per second")
+    parser.add_argument("--ops", type=int, default=2000, help="Total operations per mode")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="Fraction of operations that are writes")
+    parser.add_argument("--seed-quizzes", type=int, default=200, help="Quizzes created before the run")
+    args = parser.parse_args()
+
+    run_migrations(engine)
+    db = SessionLocal()
+    seed_ids = [sync_db.create_quiz_in_db(db, sample_quiz(i)).id for i in range(args.seed_quizzes)]
+    db.close()
+
+    results = []
+    for mode in ("sync", "async"):
+        results.append(asyncio.run(run_mode(mode, args.rate, args.ops, args.write_ratio, seed_ids)))
+
+    print(json.dumps({
+        "benchmark": "async_db",
+        "database_url": os.environ["DATABASE_URL"],
+        "arrival_rate": args.rate,
+        "ops": args.ops,
+        "write_ratio": args.write_ratio,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# bench_endpoints.py
+"""
+Throughput and latency benchmark for every API endpoint
+
+Runs the FastAPI app in-process (lifespan included) over httpx's ASGI
+transport, with the Forms, Gmail and Gemini clients replaced by the
+simulated ones installed by benchmarks/fakes.py, so no credentials or
+network are needed. Each
+endpoint is driven by --concurrency workers for --requests requests, and
+throughput, error rate and p50/p95/p99 latency are reported as JSON.
+
+Usage:
+    python benchmarks/bench_endpoints.py --requests 200 --concurrency 16
+    python benchmarks/bench_endpoints.py --endpoints list,get --error-rate 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+DB_DIR = tempfile.mkdtemp(prefix="autoforms-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(DB_DIR, 'bench.db')}")
+os.environ.setdefault("PREWARM_CLIENTS", "false")
+os.environ.setdefault("EMAIL_RETRY_BASE_DELAY", "0.05")
+os.environ.setdefault("LOG_STREAM", "stderr")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx  # noqa: E402
+import fakes  # noqa: E402
+import main  # noqa: E402
+from executors import executor_stats  # noqa: E402
+
+ENDPOINTS = ["create", "list", "get", "approve", "delete", "from-text", "from-file", "quizdetails"]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def sample_quiz(i, questions=5):
+    return {
+        "title": f"Benchmark quiz {i}",
+        "description": "Generated by bench_endpoints",
+        "questions": [
+            {"text": f"Question {n}", "options": ["A", "B", "C", "D"], "correct_answer_index": n % 4}
+            for n in range(questions)
+        ],
+    }
+
+
+def sample_text(i):
+    return f"Benchmark material {i}\n\n" + "\n".join(
+        f"{n}. Which option is correct for item {i}.{n}? A) one B) two C) three D) four"
+        for n in range(5)
+    )
+
+
+async def create_quizzes(client, count, concurrency):
+    """Setup: quizzes consumed by get/approve/delete/quizdetails, created outside the timed runs"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def create(i):
+        async with semaphore:
+            response = await client.post("/quizzes/", json=sample_quiz(f"setup-{i}"))
+            response.raise_for_status()
+            return response.json()
+
+    return await asyncio.gather(*(create(i) for i in range(count)))
+
+
+def build_request(endpoint, i, quizzes):
+    """(method, url, request kwargs) for the i-th request to an endpoint"""
+    if endpoint == "create":
+        return "POST", "/quizzes/", {"json": sample_quiz(i)}
+    if endpoint == "list":
+        params = {"limit": 20, "include": "questions"} if i % 2 else {"limit": 20}
+        return "GET", "/quizzes/", {"params": params}
+    if endpoint == "get":
+        return "GET", f"/quizzes/{quizzes[i % len(quizzes)]['id']}", {"params": {"include": "questions"}}
+    if endpoint == "approve":
+        recipients = [f"student{n}@example.com" for n in range(3)]
+        return "POST", f"/quizzes/{quizzes[i]['id']}/approve", {"json": {"recipients": recipients}}
+    if endpoint == "delete":
+        return "DELETE", f"/quizzes/{quizzes[i]['id']}", {}
+    if endpoint == "from-text":
+        return "POST", "/quizzes/from-text", {"json": {"text": sample_text(i)}}
+    if endpoint == "from-file":
+        return "POST", "/quizzes/from-file", {"files": {"file": (f"notes-{i}.md", sample_text(i).encode(), "text/markdown")}}
+    if endpoint == "quizdetails":
+        form_ids = [quiz["form_id"] for quiz in quizzes if quiz.get("form_id")] or ["fake-form-missing"]
+        return "GET", f"/quizdetails/{form_ids[i % len(form_ids)]}", {}
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+
+async def run_endpoint(client, endpoint, requests, concurrency, quizzes):
+    latencies = []
+    status_counts = {}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            method, url, kwargs = build_request(endpoint, i, quizzes)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            status_counts[status] = status_counts.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    errors = sum(count for status, count in status_counts.items() if not (isinstance(status, int) and status < 400))
+    return {
+        "endpoint": endpoint,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "wall_time_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "error_rate": round(errors / len(latencies), 4),
+        "status_counts": {str(status): count for status, count in sorted(status_counts.items(), key=str)},
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run(args):
+    upstreams = fakes.install(
+        forms_latency_ms=args.forms_latency_ms,
+        gmail_latency_ms=args.gmail_latency_ms,
+        gemini_latency_ms=args.gemini_latency_ms,
+        error_rate=args.error_rate,
+        jitter=args.jitter,
+    )
+    endpoints = args.endpoints.split(",") if args.endpoints else ENDPOINTS
+    results = []
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # approve and delete each consume one quiz per request
+            setup_count = args.requests * (1 + ("approve" in endpoints) + ("delete" in endpoints))
+            quizzes = await create_quizzes(client, setup_count, args.concurrency)
+            pools = {"approve": quizzes[args.requests:2 * args.requests], "delete": quizzes[-args.requests:]}
+            for endpoint in endpoints:
+                results.append(await run_endpoint(
+                    client, endpoint, args.requests, args.concurrency, pools.get(endpoint, quizzes[:args.requests])
+                ))
+        upstream_stats = {name: upstream.stats() for name, upstream in upstreams.items()}
+        pools_stats = executor_stats()
+    return {
+        "benchmark": "endpoints",
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "forms_latency_ms": args.forms_latency_ms,
+            "gmail_latency_ms": args.gmail_latency_ms,
+            "gemini_latency_ms": args.gemini_latency_ms,
+            "error_rate": args.error_rate,
+            "jitter": args.jitter,
+        },
+        "results": results,
+        "upstreams": upstream_stats,
+        "executors": pools_stats,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients per endpoint")
+    parser.add_argument("--endpoints", default=None, help=f"Comma-separated subset of {','.join(ENDPOINTS)}")
+    parser.add_argument("--forms-latency-ms", type=float, default=80)
+    parser.add_argument("--gmail-latency-ms", type=float, default=60)
+    parser.add_argument("--gemini-latency-ms", type=float, default=400)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake upstream calls that fail with 503")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency standard deviation as a fraction of the mean")
+    parser.add_argument("--output", default=None, help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    # The app logs to stdout; keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,127 @@
+# bench_import_time.py
+"""
+Import-time report for the app module
+
+Runs `python -X importtime -c "import main"` in fresh interpreters (a
+clean temporary working directory and database each time) and reports,
+as JSON, the median total import time, the slowest top-level imports and
+whether the Google client libraries were loaded. With --baseline-rev the
+same measurement is taken on that git revision of the tree, extracted
+with `git archive`, so the two can be compared.
+
+Usage:
+    python benchmarks/bench_import_time.py --runs 5 --baseline-rev HEAD~1
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that should only be imported once an upstream is first used
+HEAVY_MODULES = ["google.genai", "googleapiclient.discovery", "google_auth_oauthlib.flow", "google.oauth2.service_account"]
+
+PROBE = (
+    "import sys, threading, time\n"
+    "started = time.perf_counter()\n"
+    "import main\n"
+    "elapsed = time.perf_counter() - started\n"
+    "print('__PROBE__', elapsed, threading.active_count(), ','.join(m for m in {heavy!r} if m in sys.modules))\n"
+)
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_part, cumulative_us, name = line.split("|", 2)
+        self_us = int(self_part.split(":", 1)[1])
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), self_us, int(cumulative_us), depth))
+    return rows
+
+
+def measure_once(source_dir):
+    work_dir = tempfile.mkdtemp(prefix="autoforms-import-")
+    env = dict(os.environ)
+    env["PYTHONPATH"] = source_dir
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'import.db')}"
+    env["PYTHONWARNINGS"] = "ignore"
+    try:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE.format(heavy=HEAVY_MODULES)],
+            cwd=work_dir, env=env, capture_output=True, text=True, check=True,
+        )
+        probe = next(line for line in proc.stdout.splitlines() if line.startswith("__PROBE__"))
+        _, elapsed, threads, heavy = probe.split(" ", 3)
+        return {
+            "seconds": float(elapsed),
+            "threads": int(threads),
+            "heavy_loaded": [m for m in heavy.split(",") if m],
+            "files_created": sorted(os.listdir(work_dir)),
+            "imports": parse_importtime(proc.stderr),
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def report(source_dir, runs, top):
+    samples = [measure_once(source_dir) for _ in range(runs)]
+    last = samples[-1]
+    # Direct imports of the app's own modules and third-party packages, by cumulative time
+    top_level = [row for row in last["imports"] if row[3] == 1]
+    top_level.sort(key=lambda row: row[2], reverse=True)
+    return {
+        "runs": runs,
+        "import_main_ms_median": round(statistics.median(s["seconds"] for s in samples) * 1000, 1),
+        "import_main_ms_min": round(min(s["seconds"] for s in samples) * 1000, 1),
+        "modules_imported": len(last["imports"]),
+        "threads_after_import": last["threads"],
+        "files_created": last["files_created"],
+        "heavy_modules_loaded": last["heavy_loaded"],
+        "slowest_imports": [
+            {"module": name, "cumulative_ms": round(cumulative / 1000, 1)}
+            for name, _, cumulative, _ in top_level[:top]
+        ],
+    }
+
+
+def export_revision(rev, target):
+    archive = os.path.join(target, "tree.tar")
+    with open(archive, "wb") as out:
+        subprocess.run(["git", "-C", REPO_DIR, "archive", rev], stdout=out, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(target)
+    os.remove(archive)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per tree")
+    parser.add_argument("--top", type=int, default=10, help="Slowest direct imports to list")
+    parser.add_argument("--baseline-rev", help="Git revision to compare against, e.g. HEAD~1")
+    args = parser.parse_args()
+
+    results = [{"tree": "working", **report(REPO_DIR, args.runs, args.top)}]
+    if args.baseline_rev:
+        baseline_dir = tempfile.mkdtemp(prefix="autoforms-baseline-")
+        try:
+            export_revision(args.baseline_rev, baseline_dir)
+            results.insert(0, {"tree": args.baseline_rev, **report(baseline_dir, args.runs, args.top)})
+        finally:
+            shutil.rmtree(baseline_dir, ignore_errors=True)
+
+    print(json.dumps({"benchmark": "import_time", "python": sys.version.split()[0], "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# bench_indexes.py
+"""
+Benchmark for the quiz list indexes and the SQLite storage profile
+
+Seeds one database, copies it, and runs the same workload against:
+  - "baseline": no list/question indexes, SQLite default pragmas
+  - "tuned":    schema after all migrations, models.SQLITE_PRAGMAS applied
+The workload is status-filtered list pages (with keyset cursors and
+questions included), followed by concurrent writers racing readers.
+Reports p50/p95/p99 latency and write throughput as JSON.
+
+Usage:
+    python benchmarks/bench_indexes.py --quizzes 20000 --pages 300
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+DB_DIR = tempfile.mkdtemp(prefix="autoforms-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(DB_DIR, 'unused.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, insert, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from models import QuizDB, QuestionDB, QuizStatus, QuizCreate, Question, apply_sqlite_pragmas  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+import sync_db  # noqa: E402
+
+LIST_INDEXES = [index.name for table in (QuizDB.__table__, QuestionDB.__table__) for index in table.indexes]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies):
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def seed(path, quizzes, questions_per_quiz):
+    engine = create_engine(f"sqlite:///{path}")
+    run_migrations(engine)
+    rng = random.Random(7)
+    start = datetime(2024, 1, 1)
+    # Mostly approved quizzes, so filtering on draft is selective
+    statuses = [QuizStatus.APPROVED] * 8 + [QuizStatus.DRAFT, QuizStatus.DELETED]
+    quiz_rows, question_rows = [], []
+    for i in range(quizzes):
+        quiz_id = str(uuid.uuid4())
+        created_at = start + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        quiz_rows.append({
+            "id": quiz_id, "title": f"Quiz {i}", "description": "Seeded by bench_indexes",
+            "status": rng.choice(statuses), "created_at": created_at, "updated_at": created_at,
+        })
+        question_rows.extend(
+            {"quiz_id": quiz_id, "text": f"Question {n} of quiz {i}",
+             "options": ["A", "B", "C", "D"], "correct_answer_index": n % 4}
+            for n in range(questions_per_quiz)
+        )
+    # Questions go in shuffled so each quiz's rows are scattered through the table
+    rng.shuffle(question_rows)
+    with sessionmaker(bind=engine)() as db:
+        db.execute(insert(QuizDB), quiz_rows)
+        db.execute(insert(QuestionDB), question_rows)
+        db.commit()
+    engine.dispose()
+
+
+def make_baseline(path):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        for name in LIST_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        conn.execute(text("ANALYZE"))
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=DELETE")
+    engine.dispose()
+
+
+def open_engine(path, tuned):
+    engine = create_engine(f"sqlite:///{path}")
+    if tuned:
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+    return engine
+
+
+def bench_lists(engine, pages, limit):
+    """Walk status-filtered pages the way GET /quizzes/?status=...&include=questions does"""
+    Session = sessionmaker(bind=engine, autoflush=False)
+    rng = random.Random(11)
+    latencies = []
+    for _ in range(pages):
+        status = rng.choice([QuizStatus.DRAFT, QuizStatus.APPROVED])
+        cursor = None
+        for _ in range(3):
+            with Session() as db:
+                started = time.perf_counter()
+                _, cursor, _ = sync_db.get_quizzes_page(db, status, limit, cursor, include_questions=True)
+                latencies.append(time.perf_counter() - started)
+            if cursor is None:
+                break
+    return summarize(latencies)
+
+
+def bench_concurrent(engine, writers, readers, writes_per_writer, limit):
+    """Writers create quizzes while readers list drafts; counts locked-database errors"""
+    Session = sessionmaker(bind=engine, autoflush=False)
+    quiz = QuizCreate(
+        title="Concurrent quiz",
+        questions=[Question(text=f"Q{n}", options=["A", "B"], correct_answer_index=0) for n in range(5)],
+    )
+    write_latencies, read_latencies = [], []
+    errors = {"write": 0, "read": 0}
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def writer():
+        for _ in range(writes_per_writer):
+            started = time.perf_counter()
+            try:
+                with Session() as db:
+                    sync_db.create_quiz_in_db(db, quiz)
+            except Exception:
+                with lock:
+                    errors["write"] += 1
+                continue
+            with lock:
+                write_latencies.append(time.perf_counter() - started)
+
+    def reader():
+        while not done.is_set():
+            started = time.perf_counter()
+            try:
+                with Session() as db:
+                    sync_db.get_quizzes_page(db, QuizStatus.DRAFT, limit)
+            except Exception:
+                with lock:
+                    errors["read"] += 1
+                continue
+            with lock:
+                read_latencies.append(time.perf_counter() - started)
+
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer) for _ in range(writers)]
+    started = time.perf_counter()
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in reader_threads:
+        thread.join()
+    return {
+        "wall_time_s": round(elapsed, 3),
+        "writes_per_s": round(len(write_latencies) / elapsed, 1),
+        "errors": errors,
+        "write": summarize(write_latencies) if write_latencies else None,
+        "read": summarize(read_latencies) if read_latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quizzes", type=int, default=20000, help="Quizzes seeded before the run")
+    parser.add_argument("--questions", type=int, default=5, help="Questions per seeded quiz")
+    parser.add_argument("--pages", type=int, default=300, help="Paginated list walks (up to 3 pages each)")
+    parser.add_argument("--limit", type=int, default=50, help="Page size")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writes-per-writer", type=int, default=100)
+    args = parser.parse_args()
+
+    seeded = os.path.join(DB_DIR, "seed.db")
+    seed(seeded, args.quizzes, args.questions)
+    results = []
+    for variant in ("baseline", "tuned"):
+        path = os.path.join(DB_DIR, f"{variant}.db")
+        shutil.copyfile(seeded, path)
+        if variant == "baseline":
+            make_baseline(path)
+        engine = open_engine(path, tuned=variant == "tuned")
+        with engine.connect() as conn:
+            journal_mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        results.append({
+            "variant": variant,
+            "journal_mode": journal_mode,
+            "filtered_list": bench_lists(engine, args.pages, args.limit),
+            "concurrent": bench_concurrent(engine, args.writers, args.readers, args.writes_per_writer, args.limit),
+        })
+        engine.dispose()
+
+    print(json.dumps({
+        "benchmark": "indexes",
+        "quizzes": args.quizzes,
+        "questions_per_quiz": args.questions,
+        "results": results,
+    }, indent=2))
+    shutil.rmtree(DB_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# bench_option_storage.py
+"""
+Storage and decode benchmark for question options
+
+Seeds questions with options stored the old way (JSON arrays), measures
+bytes per question and the time to read and decode every row, then runs
+the compact-options migration on the same database and measures again.
+
+Usage:
+    python benchmarks/bench_option_storage.py --questions 200000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+DB_DIR = tempfile.mkdtemp(prefix="autoforms-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(DB_DIR, 'bench.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+from models import engine, OptionList  # noqa: E402
+from migrations import run_migrations, _compact_question_options  # noqa: E402
+
+WORDS = ["binary", "stack", "queue", "pointer", "kernel", "cache", "thread", "socket", "index", "tree"]
+
+
+def seed_json(questions):
+    # Old-format rows are written with raw SQL, after the schema is fully migrated
+    run_migrations(engine)
+    rng = random.Random(3)
+    rows = [
+        {
+            "quiz_id": None,
+            "text": f"Question {i}",
+            "options": json.dumps([" ".join(rng.sample(WORDS, 2)) for _ in range(4)]),
+            "correct_answer_index": i % 4,
+        }
+        for i in range(questions)
+    ]
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO questions (quiz_id, text, options, correct_answer_index) "
+                 "VALUES (:quiz_id, :text, :options, :correct_answer_index)"),
+            rows
+        )
+
+
+def measure(label, questions, read):
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+        option_bytes = conn.exec_driver_sql("SELECT SUM(LENGTH(CAST(options AS BLOB))) FROM questions").scalar()
+        page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+        page_count = conn.exec_driver_sql("PRAGMA page_count").scalar()
+        started = time.perf_counter()
+        decoded = read(conn)
+        elapsed = time.perf_counter() - started
+    assert len(decoded) == questions and len(decoded[0]) == 4
+    return {
+        "encoding": label,
+        "option_bytes_per_question": round(option_bytes / questions, 2),
+        "database_bytes_per_question": round(page_size * page_count / questions, 2),
+        "read_and_decode_s": round(elapsed, 4),
+        "read_and_decode_us_per_question": round(elapsed / questions * 1e6, 3),
+    }
+
+
+def read_json(conn):
+    # The old read path: json.loads per row
+    return [json.loads(value) for value in conn.execute(text("SELECT options FROM questions")).scalars()]
+
+
+def read_compact(conn):
+    # Same fetch, decoded the way the OptionList column type does it
+    decode = OptionList().process_result_value
+    return [decode(value, None) for value in conn.execute(text("SELECT options FROM questions")).scalars()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200000, help="Questions seeded")
+    args = parser.parse_args()
+
+    seed_json(args.questions)
+    results = [measure("json", args.questions, read_json)]
+    with engine.begin() as conn:
+        _compact_question_options(conn)
+    results.append(measure("compact", args.questions, read_compact))
+
+    print(json.dumps({"benchmark": "option_storage", "questions": args.questions, "results": results}, indent=2))
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
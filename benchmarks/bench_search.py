@@ -0,0 +1,184 @@
+# bench_search.py
+"""
+Benchmark for quiz full-text search: FTS5 index against a LIKE scan
+
+Seeds a database with quizzes whose titles, descriptions, questions and
+options are drawn from a word list with a long tail of rare words, then
+runs the same one- and two-word queries through:
+  - "fts":  helpers.search_quizzes_async (quiz_search MATCH, bm25, snippet)
+  - "like": every word must appear in the title, description, or a
+            question's text or options (LIKE '%word%'), newest first
+Both return one page of results plus the total match count. Also reports
+how long seeding took with and without the search triggers, i.e. the
+write cost of keeping the index up to date. Results are printed as JSON.
+
+Usage:
+    python benchmarks/bench_search.py --quizzes 20000 --queries 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+DB_DIR = tempfile.mkdtemp(prefix="autoforms-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(DB_DIR, 'unused.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import and_, create_engine, event, exists, func, insert, or_, select, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from models import QuizDB, QuestionDB, QuizStatus, apply_sqlite_pragmas  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+import helpers  # noqa: E402
+
+SEARCH_TRIGGERS = [
+    "quiz_search_quiz_insert", "quiz_search_quiz_update", "quiz_search_quiz_delete",
+    "quiz_search_question_insert", "quiz_search_question_update", "quiz_search_question_delete",
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies):
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def make_vocabulary(size, rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(4, 10))))
+    return sorted(words)
+
+
+def zipf_word(vocabulary, rng):
+    # Word i is drawn with probability ~ 1/(i+1): a few common words, many rare ones
+    return vocabulary[min(len(vocabulary) - 1, int(len(vocabulary) ** rng.random()) - 1)]
+
+
+def sentence(vocabulary, rng, words):
+    return " ".join(zipf_word(vocabulary, rng) for _ in range(words))
+
+
+def seed(path, quizzes, questions_per_quiz, vocabulary, with_triggers):
+    """Create the schema and insert the seeded quizzes; returns the insert time in seconds"""
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+    run_migrations(engine)
+    if not with_triggers:
+        with engine.begin() as conn:
+            for name in SEARCH_TRIGGERS:
+                conn.execute(text(f"DROP TRIGGER {name}"))
+
+    rng = random.Random(7)
+    start = datetime(2024, 1, 1)
+    statuses = [QuizStatus.APPROVED] * 8 + [QuizStatus.DRAFT, QuizStatus.DELETED]
+    quiz_rows, question_rows = [], []
+    for _ in range(quizzes):
+        quiz_id = str(uuid.uuid4())
+        created_at = start + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        quiz_rows.append({
+            "id": quiz_id, "title": sentence(vocabulary, rng, 3), "description": sentence(vocabulary, rng, 12),
+            "status": rng.choice(statuses), "created_at": created_at, "updated_at": created_at,
+        })
+        question_rows.extend(
+            {"quiz_id": quiz_id, "text": sentence(vocabulary, rng, 10),
+             "options": [sentence(vocabulary, rng, 2) for _ in range(4)], "correct_answer_index": 0}
+            for _ in range(questions_per_quiz)
+        )
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(insert(QuizDB), quiz_rows)
+        conn.execute(insert(QuestionDB), question_rows)
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+    return elapsed
+
+
+async def like_search(db, q, limit):
+    """The naive alternative: substring-match every word anywhere in the quiz"""
+    conditions = []
+    for word in q.split():
+        pattern = f"%{word}%"
+        conditions.append(or_(
+            QuizDB.title.like(pattern),
+            QuizDB.description.like(pattern),
+            exists().where(
+                QuestionDB.quiz_id == QuizDB.id,
+                or_(QuestionDB.text.like(pattern), QuestionDB.options.like(pattern)),
+            ),
+        ))
+    query = select(QuizDB).where(QuizDB.status != QuizStatus.DELETED, and_(*conditions))
+    total = (await db.execute(query.with_only_columns(func.count()))).scalar_one()
+    quizzes = (await db.execute(query.order_by(QuizDB.created_at.desc()).limit(limit))).scalars().all()
+    return quizzes, total
+
+
+async def bench_queries(path, queries, limit):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    event.listen(engine.sync_engine, "connect", apply_sqlite_pragmas)
+    results = {}
+    for variant in ("fts", "like"):
+        latencies, totals = [], []
+        for q in queries:
+            async with AsyncSession(engine) as db:
+                started = time.perf_counter()
+                if variant == "fts":
+                    _, _, total = await helpers.search_quizzes_async(db, q, limit=limit)
+                else:
+                    _, total = await like_search(db, q, limit)
+                latencies.append(time.perf_counter() - started)
+                totals.append(total)
+        results[variant] = {**summarize(latencies), "mean_matches": round(sum(totals) / len(totals), 1)}
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quizzes", type=int, default=20000, help="Quizzes seeded before the run")
+    parser.add_argument("--questions", type=int, default=5, help="Questions per seeded quiz")
+    parser.add_argument("--vocabulary", type=int, default=20000, help="Distinct words in the seeded text")
+    parser.add_argument("--queries", type=int, default=300, help="Search queries per variant")
+    parser.add_argument("--limit", type=int, default=20, help="Page size")
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    path = os.path.join(DB_DIR, "search.db")
+    seed_with_index = seed(path, args.quizzes, args.questions, vocabulary, with_triggers=True)
+    seed_without_index = seed(os.path.join(DB_DIR, "no_index.db"), args.quizzes, args.questions, vocabulary, with_triggers=False)
+
+    # Half one-word, half two-word queries, drawn like the seeded text
+    queries = [
+        " ".join(zipf_word(vocabulary, rng) for _ in range(1 + i % 2))
+        for i in range(args.queries)
+    ]
+    print(json.dumps({
+        "benchmark": "search",
+        "quizzes": args.quizzes,
+        "questions_per_quiz": args.questions,
+        "seed_s": {"with_search_index": round(seed_with_index, 3), "without_search_index": round(seed_without_index, 3)},
+        "results": asyncio.run(bench_queries(path, queries, args.limit)),
+    }, indent=2))
+    shutil.rmtree(DB_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# fakes.py
+"""
+Offline Forms, Gmail and Gemini clients for the benchmarks
+
+These are simulation.py's clients (the ones UPSTREAM_PROVIDER=simulated
+uses), with latency, jitter and error rate taken from the benchmark's
+arguments instead of the SIMULATED_* environment variables, and forms kept
+in memory. Install them with install(); everything else runs unmodified.
+"""
+from simulation import MemoryFormStore, SimulatedUpstream, build_simulated_clients
+
+
+def install(forms_latency_ms=80, gmail_latency_ms=60, gemini_latency_ms=400, error_rate=0.0, jitter=0.2, seed=1):
+    """Swap simulated clients into clients.client_registry; returns the SimulatedUpstream of each service"""
+    from clients import client_registry
+    upstreams = {
+        "forms": SimulatedUpstream("forms", forms_latency_ms, jitter, error_rate=error_rate, seed=seed),
+        "gmail": SimulatedUpstream("gmail", gmail_latency_ms, jitter, error_rate=error_rate, seed=seed + 1),
+        "genai": SimulatedUpstream("genai", gemini_latency_ms, jitter, error_rate=error_rate, seed=seed + 2),
+    }
+    clients, _ = build_simulated_clients(MemoryFormStore(), upstreams)
+    for name, client in clients.items():
+        client_registry.override(name, client)
+    return upstreams
@@ -0,0 +1,80 @@
+# sync_db.py
+"""
+The blocking Session helpers the routes used before the async database path
+
+Kept only as the "old path" the benchmarks compare against; the API uses
+the async helpers in helpers.py.
+"""
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session, selectinload
+
+from models import QuizDB, QuestionDB, QuizStatus
+from helpers import decode_quiz_cursor, encode_quiz_cursor
+
+
+def get_quiz_by_id(db: Session, quiz_id: str):
+    """Get a quiz by ID"""
+    return db.query(QuizDB).filter(QuizDB.id == quiz_id).first()
+
+def get_quizzes_page(db: Session, status=None, limit: int = 50, cursor: Optional[str] = None,
+                     include_questions: bool = False):
+    """Sync version of helpers.get_quizzes_page_async"""
+    query = db.query(QuizDB).filter(QuizDB.status != QuizStatus.DELETED)
+    if status:
+        query = query.filter(QuizDB.status == status)
+    total = query.with_entities(func.count(QuizDB.id)).scalar()
+
+    if cursor:
+        created_at, quiz_id = decode_quiz_cursor(cursor)
+        query = query.filter(tuple_(QuizDB.created_at, QuizDB.id) < tuple_(created_at, quiz_id))
+
+    # Fetch one extra row to know whether another page exists
+    if include_questions:
+        query = query.options(selectinload(QuizDB.questions))
+    quizzes = (
+        query.order_by(QuizDB.created_at.desc(), QuizDB.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(quizzes) > limit:
+        quizzes = quizzes[:limit]
+        next_cursor = encode_quiz_cursor(quizzes[-1])
+    return quizzes, next_cursor, total
+
+def create_quiz_in_db(db: Session, quiz_data, form_id=None, form_url=None):
+    """Create a new quiz in the database"""
+    quiz_id = str(uuid.uuid4())
+    current_time = datetime.now()
+
+    db_quiz = QuizDB(
+        id=quiz_id,
+        title=quiz_data.title,
+        description=quiz_data.description,
+        status=QuizStatus.DRAFT,
+        form_id=form_id,
+        form_url=form_url,
+        created_at=current_time,
+        updated_at=current_time
+    )
+
+    db.add(db_quiz)
+    db.commit()
+
+    # Add questions
+    for question in quiz_data.questions:
+        db_question = QuestionDB(
+            quiz_id=quiz_id,
+            text=question.text,
+            options=question.options,
+            correct_answer_index=question.correct_answer_index
+        )
+        db.add(db_question)
+
+    db.commit()
+    db.refresh(db_quiz)
+    return db_quiz
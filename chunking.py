@@ -0,0 +1,111 @@
+# chunking.py - Split long documents for extraction and merge the results
+
+import re
+from difflib import SequenceMatcher
+
+HEADING_PATTERN = re.compile(r"^#{1,6}\s", re.MULTILINE)
+
+
+def _split_sections(text: str):
+    """Split markdown text before each heading; plain text comes back as one section"""
+    starts = [match.start() for match in HEADING_PATTERN.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    starts.append(len(text))
+    return [text[start:end] for start, end in zip(starts, starts[1:]) if text[start:end].strip()]
+
+
+def _split_units(section: str, max_chars: int):
+    """Break a section into paragraph-sized pieces no longer than max_chars"""
+    if len(section) <= max_chars:
+        return [section]
+    units = []
+    for paragraph in re.split(r"\n\s*\n", section):
+        if not paragraph.strip():
+            continue
+        while len(paragraph) > max_chars:
+            # No paragraph break available: cut at the last line break or space before the limit
+            cut = max(paragraph.rfind("\n", 0, max_chars), paragraph.rfind(" ", 0, max_chars))
+            if cut <= 0:
+                cut = max_chars
+            units.append(paragraph[:cut])
+            paragraph = paragraph[cut:].lstrip()
+        units.append(paragraph)
+    return units
+
+
+def split_into_chunks(text: str, max_chars: int, overlap_chars: int):
+    """
+    Split text into chunks of at most max_chars along semantic boundaries
+
+    Markdown headings are preferred boundaries, then paragraphs, then lines.
+    Each chunk after the first starts with the trailing paragraphs of the
+    previous chunk (up to overlap_chars) so questions that straddle a
+    boundary are seen whole at least once.
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    units = []
+    for section in _split_sections(text):
+        units.extend(_split_units(section.strip("\n"), max_chars))
+
+    chunks = []
+    current = []
+    current_len = 0
+    for unit in units:
+        if current and current_len + len(unit) + 2 > max_chars:
+            chunks.append("\n\n".join(current))
+            # Carry trailing units over as overlap
+            overlap = []
+            overlap_len = 0
+            for previous in reversed(current):
+                if overlap_len + len(previous) > overlap_chars or overlap_len + len(previous) + len(unit) > max_chars:
+                    break
+                overlap.insert(0, previous)
+                overlap_len += len(previous) + 2
+            current, current_len = overlap, overlap_len
+        current.append(unit)
+        current_len += len(unit) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _normalize_question(text: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", "", text.lower())).strip()
+
+
+def _is_near_duplicate(normalized: str, tokens: set, other: str, other_tokens: set, similarity: float) -> bool:
+    # Word overlap keeps questions that differ only in a number or a key term apart
+    union = tokens | other_tokens
+    if not union or len(tokens & other_tokens) / len(union) < similarity:
+        return False
+    matcher = SequenceMatcher(None, normalized, other)
+    return matcher.quick_ratio() >= similarity and matcher.ratio() >= similarity
+
+
+def dedupe_questions(questions, similarity: float):
+    """
+    Drop questions whose text is a near-duplicate of an earlier one
+
+    Overlapping chunks return the same question twice, often with slightly
+    different punctuation or spacing; the first occurrence is kept. Two
+    questions are near-duplicates when both their word sets (Jaccard) and
+    their character sequences are at least `similarity` alike.
+    """
+    kept = []
+    kept_normalized = []
+    seen = set()
+    for question in questions:
+        normalized = _normalize_question(question.text)
+        if normalized in seen:
+            continue
+        tokens = set(normalized.split())
+        if any(_is_near_duplicate(normalized, tokens, other, other_tokens, similarity)
+               for other, other_tokens in kept_normalized):
+            continue
+        seen.add(normalized)
+        kept.append(question)
+        kept_normalized.append((normalized, tokens))
+    return kept
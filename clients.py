@@ -0,0 +1,266 @@
+# clients.py - Long-lived Google API and Gemini clients
+
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+# The Google client libraries take around a second to import, so they are
+# imported inside the methods that first need them, not at module load
+
+logger = logging.getLogger(__name__)
+
+FORMS_SCOPES = ['https://www.googleapis.com/auth/forms.body', 'https://www.googleapis.com/auth/forms.body.readonly']
+# If modifying these SCOPES, delete the token.json file and re-authenticate
+GMAIL_SCOPES = ["https://www.googleapis.com/auth/gmail.send"]
+
+# Access tokens are refreshed in the background once they are this close to
+# expiry; a request only waits for a refresh if the token has already expired
+CREDENTIALS_REFRESH_MARGIN = timedelta(seconds=int(os.getenv("CREDENTIALS_REFRESH_MARGIN", 300)))
+HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", 60))
+# "google" for the real APIs, "simulated" for the offline backends in simulation.py
+UPSTREAM_PROVIDER = os.getenv("UPSTREAM_PROVIDER", "google")
+UPSTREAMS = ("forms", "gmail", "genai")
+
+
+class ClientRegistry:
+    """
+    Builds each upstream client once per process and shares it
+
+    Discovery-based services are built from the discovery documents bundled
+    with googleapiclient (no discovery fetch). httplib2 connections are not
+    thread-safe, so every worker thread gets its own keep-alive connection
+    per service while the service object and credentials are shared.
+    Credentials are cached in memory and refreshed ahead of expiry by a
+    background thread, one refresh at a time per upstream. Missing
+    credentials are not cached: they are looked for again on the next call,
+    so authorizing Gmail with `python clients.py` needs no restart.
+
+    Each upstream has its own lock, held only to read or publish its state,
+    never during network or file I/O: two threads building the same client
+    at once may both build it, and the first one stored wins.
+
+    With provider "simulated" every client comes from simulation.py
+    instead, and no credentials or network are used.
+    """
+
+    def __init__(self, provider: str = UPSTREAM_PROVIDER):
+        self.provider = provider
+        self._locks = {name: threading.Lock() for name in UPSTREAMS}
+        self._simulated_lock = threading.Lock()
+        self._local = threading.local()
+        self._services = {}
+        self._credentials = {}
+        self._refreshes = {}
+        self._genai_client = None
+        self._simulated = None
+        self._simulated_upstreams = None
+
+    # Credentials
+
+    def _load_forms_credentials(self):
+        creds_file = os.environ.get('GOOGLE_CREDENTIALS_FILE', 'credentials2.json')
+        if not os.path.exists(creds_file):
+            logger.warning("Google credentials file %s not found", creds_file)
+            return None
+        from google.oauth2 import service_account
+        return service_account.Credentials.from_service_account_file(creds_file, scopes=FORMS_SCOPES)
+
+    def _load_gmail_credentials(self):
+        from google.oauth2.credentials import Credentials
+        if not os.path.exists("token.json"):
+            # The interactive consent flow can't run inside a server process
+            logger.warning("Gmail token.json not found; run `python clients.py` once to authorize Gmail")
+            return None
+        creds = Credentials.from_authorized_user_file("token.json", GMAIL_SCOPES)
+        if not creds.valid and not (creds.expired and creds.refresh_token):
+            logger.warning("Gmail token.json can't be refreshed; run `python clients.py` to authorize Gmail again")
+            return None
+        # An expired token is refreshed by credentials() like any other
+        return creds
+
+    def _save_gmail_token(self, creds):
+        with open("token.json", "w") as token:
+            token.write(creds.to_json())
+
+    def _needs_refresh(self, creds):
+        if not creds.token or not creds.expiry:
+            return not creds.valid
+        # google-auth keeps expiry as a naive UTC datetime
+        return creds.expiry - datetime.utcnow() < CREDENTIALS_REFRESH_MARGIN
+
+    def credentials(self, name: str):
+        """Cached credentials for an upstream, refreshed in the background before expiry"""
+        with self._locks[name]:
+            creds = self._credentials.get(name)
+        if creds is None:
+            loader = self._load_forms_credentials if name == "forms" else self._load_gmail_credentials
+            creds = loader()
+            if creds is None:
+                return None
+            with self._locks[name]:
+                creds = self._credentials.setdefault(name, creds)
+        if self._needs_refresh(creds):
+            refresh = self._start_refresh(name, creds)
+            if not creds.valid:
+                # Already expired: this call can't go ahead without the new token
+                refresh.result(timeout=HTTP_TIMEOUT)
+        return creds
+
+    def _start_refresh(self, name: str, creds) -> Future:
+        """Refresh creds on a background thread, unless a refresh is already running"""
+        with self._locks[name]:
+            refresh = self._refreshes.get(name)
+            if refresh is None:
+                refresh = self._refreshes[name] = Future()
+                threading.Thread(
+                    target=self._refresh, args=(name, creds, refresh), name=f"{name}-credentials-refresh", daemon=True
+                ).start()
+            return refresh
+
+    def _refresh(self, name: str, creds, refresh: Future):
+        try:
+            from google.auth.transport.requests import Request
+            creds.refresh(Request())
+            if name == "gmail":
+                self._save_gmail_token(creds)
+            refresh.set_result(creds)
+        except Exception as e:
+            logger.warning("Refreshing %s credentials failed: %s", name, e)
+            refresh.set_exception(e)
+        finally:
+            with self._locks[name]:
+                del self._refreshes[name]
+
+    # Discovery services
+
+    def _thread_http(self, name: str):
+        """Per-thread authorized HTTP connection for a service"""
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        if name not in connections:
+            import httplib2
+            import google_auth_httplib2
+            connections[name] = google_auth_httplib2.AuthorizedHttp(
+                self.credentials(name), http=httplib2.Http(timeout=HTTP_TIMEOUT)
+            )
+        return connections[name]
+
+    def _request_builder(self, name: str):
+        from googleapiclient.http import HttpRequest
+
+        def build_request(http, *args, **kwargs):
+            # Keeps credentials fresh and routes the call over this thread's connection
+            self.credentials(name)
+            return HttpRequest(self._thread_http(name), *args, **kwargs)
+        return build_request
+
+    def _build_service(self, name: str, api: str, version: str):
+        with self._locks[name]:
+            if name in self._services:
+                return self._services[name]
+        if self.provider == "simulated":
+            service = self._simulated_client(name)
+        else:
+            service = None
+            try:
+                creds = self.credentials(name)
+                if creds is not None:
+                    import httplib2
+                    import google_auth_httplib2
+                    from googleapiclient.discovery import build
+                    service = build(
+                        api, version,
+                        http=google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT)),
+                        requestBuilder=self._request_builder(name),
+                        static_discovery=True,
+                        cache_discovery=False,
+                    )
+            except Exception as e:
+                logger.error("Error setting up %s API: %s", api, e)
+                return None
+            if service is None:
+                # Not cached, so the service is built once credentials show up
+                return None
+        with self._locks[name]:
+            return self._services.setdefault(name, service)
+
+    def forms_service(self):
+        """Shared Google Forms service, or None if credentials are not configured"""
+        return self._build_service("forms", "forms", "v1")
+
+    def gmail_service(self):
+        """Shared Gmail service"""
+        return self._build_service("gmail", "gmail", "v1")
+
+    # Gemini
+
+    def genai_configured(self) -> bool:
+        """Whether a Gemini client is or can be built, without building it (safe on the event loop)"""
+        return self.provider == "simulated" or self._genai_client is not None or bool(os.getenv("GEMINI_API_KEY"))
+
+    def genai_client(self):
+        """Shared Gemini client (its HTTP connection pool is reused across calls)"""
+        with self._locks["genai"]:
+            if self._genai_client is not None:
+                return self._genai_client
+        if self.provider == "simulated":
+            client = self._simulated_client("genai")
+        else:
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                return None
+            from google import genai
+            client = genai.Client(api_key=api_key)
+        with self._locks["genai"]:
+            if self._genai_client is None:
+                self._genai_client = client
+            return self._genai_client
+
+    # Simulated upstreams
+
+    def _simulated_client(self, name: str):
+        with self._simulated_lock:
+            if self._simulated is None:
+                # Imported lazily: simulation.py depends on models, which the real provider never needs here
+                from simulation import build_simulated_clients
+                self._simulated, self._simulated_upstreams = build_simulated_clients()
+            return self._simulated[name]
+
+    def simulation_stats(self):
+        """Call, throttle and failure counts per simulated upstream, or None with the real provider"""
+        if self._simulated_upstreams is None:
+            return None
+        return {name: upstream.stats() for name, upstream in self._simulated_upstreams.items()}
+
+    def override(self, name: str, client):
+        """Replace the "forms", "gmail" or "genai" client, e.g. with an in-process fake"""
+        with self._locks[name]:
+            if name == "genai":
+                self._genai_client = client
+            else:
+                self._services[name] = client
+
+    def warm_up(self):
+        """Build the clients ahead of the first request"""
+        self.forms_service()
+        self.genai_client()
+        # Only pre-build Gmail when a token exists, so a missing one isn't cached as "no Gmail"
+        if self.provider == "simulated" or os.path.exists("token.json"):
+            self.gmail_service()
+
+
+client_registry = ClientRegistry()
+
+
+def authorize_gmail():
+    """Run the interactive Gmail OAuth consent flow and save token.json"""
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    flow = InstalledAppFlow.from_client_secrets_file("credentials.json", GMAIL_SCOPES)
+    client_registry._save_gmail_token(flow.run_local_server(port=0))
+
+
+if __name__ == "__main__":
+    authorize_gmail()
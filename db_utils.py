@@ -2,8 +2,8 @@
 import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from models import Base, QuizDB, QuestionDB, QuizStatus
-import json
+from models import QuizDB, QuestionDB, QuizStatus
+from migrations import run_migrations
 from datetime import datetime
 import uuid
 
@@ -15,7 +15,7 @@ def init_db(db_path="./autoforms.db"):
     
     # Create database
     engine = create_engine(f"sqlite:///{db_path}")
-    Base.metadata.create_all(engine)
+    run_migrations(engine)
     
     # Create session
     SessionLocal = sessionmaker(bind=engine)
@@ -42,24 +42,24 @@ def seed_sample_data(db):
     q1 = QuestionDB(
         quiz_id=quiz1_id,
         text="What is Python?",
-        options=json.dumps([
+        options=[
             "A programming language", 
             "A snake", 
             "A game", 
             "An operating system"
-        ]),
+        ],
         correct_answer_index=0
     )
     
     q2 = QuestionDB(
         quiz_id=quiz1_id,
         text="Which symbol is used for comments in Python?",
-        options=json.dumps([
+        options=[
             "//", 
             "/*", 
             "#", 
             "--"
-        ]),
+        ],
         correct_answer_index=2
     )
     
@@ -85,24 +85,24 @@ def seed_sample_data(db):
     q3 = QuestionDB(
         quiz_id=quiz2_id,
         text="What is JavaScript primarily used for?",
-        options=json.dumps([
+        options=[
             "Server-side programming", 
             "Web development", 
             "Mobile app development", 
             "Database management"
-        ]),
+        ],
         correct_answer_index=1
     )
     
     q4 = QuestionDB(
         quiz_id=quiz2_id,
         text="Which keyword is used to declare variables in JavaScript?",
-        options=json.dumps([
+        options=[
             "dim", 
             "var", 
             "variable", 
             "declare"
-        ]),
+        ],
         correct_answer_index=1
     )
     
@@ -0,0 +1,285 @@
+# email_fanout.py - Per-recipient quiz invitation delivery
+
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import AsyncSessionLocal, EmailDeliveryDB, DeliveryStatus, QuizDB
+from helpers import send_quiz_invitation
+from resilience import CircuitOpenError, UpstreamTimeout, gmail_upstream, is_retryable
+from logging_config import truncate
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Async token bucket allowing `rate` acquisitions per second with bursts of `burst`"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class EmailFanout:
+    """
+    Sends quiz invitations as individual messages, one delivery row per recipient
+
+    Deliveries run concurrently up to `concurrency`, never faster than the
+    configured Gmail rate, and retry transient failures with jittered
+    exponential backoff. A worker leases a delivery with a conditional UPDATE
+    before sending it, so processes sharing the database never send the same
+    delivery concurrently; the lease is renewed before every attempt.
+    A periodic sweep resumes queued deliveries nobody holds. A delivery whose
+    lease expired after an attempt was recorded may already have been sent by
+    the worker that died, so it is marked unknown rather than sent again.
+    """
+
+    def __init__(self, concurrency: int, rate: float, burst: int, max_attempts: int, base_delay: float,
+                 lease_seconds: int, sweep_seconds: float):
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.sweep_seconds = sweep_seconds
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self._bucket = TokenBucket(rate, burst)
+        self._semaphore = None
+        self._tasks = set()
+        self._active = set()
+        self._sweeper = None
+
+    async def start(self):
+        """Resume queued deliveries, then keep sweeping for abandoned ones"""
+        resumed = await self.sweep()
+        if resumed:
+            logger.info("Resuming %d queued email deliveries", resumed)
+        self._sweeper = asyncio.create_task(self._sweep_periodically())
+
+    async def sweep(self) -> int:
+        """
+        Settle deliveries whose worker died and submit the claimable ones
+
+        Returns how many deliveries were submitted.
+        """
+        now = datetime.now()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(EmailDeliveryDB)
+                .where(
+                    EmailDeliveryDB.status == DeliveryStatus.QUEUED,
+                    EmailDeliveryDB.lease_until < now,
+                    EmailDeliveryDB.attempts > 0,
+                )
+                .values(status=DeliveryStatus.UNKNOWN, last_error="Lease expired during delivery",
+                        lease_until=None, updated_at=now)
+            )
+            await db.commit()
+            result = await db.execute(
+                select(EmailDeliveryDB.id, QuizDB.title, QuizDB.form_url)
+                .join(QuizDB, QuizDB.id == EmailDeliveryDB.quiz_id)
+                .where(EmailDeliveryDB.status == DeliveryStatus.QUEUED, _claimable(now))
+            )
+            pending = [row for row in result.all() if row.id not in self._active]
+        for delivery_id, quiz_title, form_url in pending:
+            self._submit(delivery_id, quiz_title, form_url)
+        return len(pending)
+
+    async def _sweep_periodically(self):
+        while True:
+            await asyncio.sleep(self.sweep_seconds)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Email delivery sweep failed")
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def queue_deliveries(self, db: AsyncSession, quiz_id: str, recipients):
+        """Add one queued delivery per distinct recipient to the session (the caller commits)"""
+        current_time = datetime.now()
+        deliveries = [
+            EmailDeliveryDB(
+                quiz_id=quiz_id,
+                recipient=recipient,
+                status=DeliveryStatus.QUEUED,
+                attempts=0,
+                created_at=current_time,
+                updated_at=current_time
+            )
+            for recipient in dict.fromkeys(r.strip() for r in recipients if r.strip())
+        ]
+        db.add_all(deliveries)
+        return deliveries
+
+    def dispatch(self, deliveries, quiz_title: str, form_url: str):
+        """Start sending committed deliveries in the background"""
+        for delivery in deliveries:
+            self._submit(delivery.id, quiz_title, form_url)
+
+    def _submit(self, delivery_id: int, quiz_title: str, form_url: str):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if delivery_id in self._active:
+            return
+        self._active.add(delivery_id)
+        task = asyncio.create_task(self._deliver(delivery_id, quiz_title, form_url))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._active.discard(delivery_id))
+
+    async def _claim(self, delivery_id: int) -> bool:
+        """Lease a queued delivery; False if it is done or another worker is sending it"""
+        now = datetime.now()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(EmailDeliveryDB)
+                .where(
+                    EmailDeliveryDB.id == delivery_id,
+                    EmailDeliveryDB.status == DeliveryStatus.QUEUED,
+                    _claimable(now),
+                )
+                .values(lease_until=now + timedelta(seconds=self.lease_seconds), updated_at=now)
+            )
+            await db.commit()
+            return result.rowcount == 1
+
+    async def _interrupted(self, delivery_id: int, sending: bool):
+        """
+        Give a delivery up when its task is cancelled
+
+        Between sends it is handed back to the queue; during a send the message
+        may already have gone out, so its outcome is unknown.
+        """
+        values = {"lease_until": None, "updated_at": datetime.now()}
+        if sending:
+            values.update(status=DeliveryStatus.UNKNOWN, last_error="Interrupted while sending")
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(EmailDeliveryDB)
+                .where(EmailDeliveryDB.id == delivery_id, EmailDeliveryDB.status == DeliveryStatus.QUEUED)
+                .values(**values)
+            )
+            await db.commit()
+
+    async def _deliver(self, delivery_id: int, quiz_title: str, form_url: str):
+        async with self._semaphore:
+            if not await self._claim(delivery_id):
+                return
+            try:
+                await self._send(delivery_id, quiz_title, form_url)
+            except asyncio.CancelledError:
+                await asyncio.shield(self._interrupted(delivery_id, sending=False))
+                raise
+
+    async def _send(self, delivery_id: int, quiz_title: str, form_url: str):
+        async with AsyncSessionLocal() as db:
+            delivery = await db.get(EmailDeliveryDB, delivery_id)
+
+            while True:
+                await self._bucket.acquire()
+                # Recorded before sending, renewing the lease for this attempt
+                delivery.attempts += 1
+                delivery.lease_until = datetime.now() + timedelta(seconds=self.lease_seconds)
+                await db.commit()
+                try:
+                    # Not retried by the upstream wrapper: a send that timed out may still have gone out
+                    await gmail_upstream.call(send_quiz_invitation, delivery.recipient, quiz_title, form_url)
+                except asyncio.CancelledError:
+                    await asyncio.shield(self._interrupted(delivery_id, sending=True))
+                    raise
+                except CircuitOpenError as e:
+                    # Gmail is failing fast: wait for the breaker to let calls through without using up attempts
+                    delivery.attempts -= 1
+                    await asyncio.sleep(float(e.headers["Retry-After"]))
+                    continue
+                except UpstreamTimeout as e:
+                    # The message may already have gone out, so it is never sent again
+                    delivery.status = DeliveryStatus.UNKNOWN
+                    delivery.last_error = e.detail
+                    delivery.lease_until = None
+                    delivery.updated_at = datetime.now()
+                    await db.commit()
+                    logger.warning("Email delivery outcome unknown", extra={
+                        "delivery_id": delivery.id,
+                        "attempts": delivery.attempts,
+                        "error": e.detail,
+                    })
+                    return
+                except Exception as e:
+                    delivery.last_error = str(getattr(e, "detail", e))
+                    delivery.updated_at = datetime.now()
+                    if delivery.attempts >= self.max_attempts or not is_retryable(e):
+                        delivery.status = DeliveryStatus.FAILED
+                        delivery.lease_until = None
+                        await db.commit()
+                        logger.warning("Email delivery failed", extra={
+                            "delivery_id": delivery.id,
+                            "attempts": delivery.attempts,
+                            "error": truncate(delivery.last_error),
+                        })
+                        return
+                    await db.commit()
+                    delay = self.base_delay * 2 ** (delivery.attempts - 1)
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                    continue
+
+                delivery.status = DeliveryStatus.SENT
+                delivery.sent_at = datetime.now()
+                delivery.updated_at = delivery.sent_at
+                delivery.lease_until = None
+                await db.commit()
+                return
+
+
+def _claimable(now: datetime):
+    """Deliveries no worker holds: never leased, handed back, or abandoned before the first attempt"""
+    return or_(
+        EmailDeliveryDB.lease_until.is_(None),
+        and_(EmailDeliveryDB.lease_until < now, EmailDeliveryDB.attempts == 0),
+    )
+
+
+email_fanout = EmailFanout(
+    concurrency=int(os.getenv("EMAIL_FANOUT_CONCURRENCY", 8)),
+    rate=float(os.getenv("GMAIL_RATE_LIMIT", 10)),
+    burst=int(os.getenv("GMAIL_RATE_BURST", 10)),
+    max_attempts=int(os.getenv("EMAIL_MAX_ATTEMPTS", 5)),
+    base_delay=float(os.getenv("EMAIL_RETRY_BASE_DELAY", 1.0)),
+    lease_seconds=int(os.getenv("EMAIL_LEASE_SECONDS", 120)),
+    sweep_seconds=float(os.getenv("EMAIL_SWEEP_SECONDS", 30)),
+)
+
+
+async def get_quiz_deliveries(db: AsyncSession, quiz_id: str):
+    """All delivery rows for a quiz, oldest first"""
+    result = await db.execute(
+        select(EmailDeliveryDB)
+        .where(EmailDeliveryDB.quiz_id == quiz_id)
+        .order_by(EmailDeliveryDB.id)
+    )
+    return result.scalars().all()
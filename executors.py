@@ -0,0 +1,177 @@
+# executors.py - Bounded thread pools for blocking upstream calls
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from metrics import timed_upstream
+
+# Set in a pool thread once the caller has stopped waiting for the call
+_abandoned = contextvars.ContextVar("upstream_call_abandoned", default=None)
+
+
+def call_abandoned() -> bool:
+    """In a pool thread: whether the caller gave up (e.g. timed out), so further requests are wasted"""
+    event = _abandoned.get()
+    return event is not None and event.is_set()
+
+
+class UpstreamExecutor:
+    """
+    Thread pool dedicated to one upstream (Forms, Gmail, Gemini)
+
+    Blocking client calls run here instead of on the event loop. Each pool
+    has its own size and queue limit, so a slow upstream can only exhaust
+    its own workers, and tracks queue depth and queue wait time.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-upstream")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.wait_count = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on this pool and await its result"""
+        return await self._run(fn, args, kwargs)
+
+    async def run_with_timeout(self, timeout: float, fn, *args, **kwargs):
+        """
+        Like run, but raise asyncio.TimeoutError if fn runs for longer than timeout
+
+        The deadline starts when a worker picks the call up, so time spent
+        queued behind other calls is not blamed on the upstream; a call still
+        queued after timeout is dropped with 503 instead. A timed-out fn keeps
+        its thread until it returns, but call_abandoned() lets it stop early.
+        """
+        loop = asyncio.get_running_loop()
+        started = asyncio.Event()
+        task = asyncio.ensure_future(
+            self._run(fn, args, kwargs, on_start=lambda: loop.call_soon_threadsafe(started.set))
+        )
+        waiter = asyncio.ensure_future(started.wait())
+        try:
+            done, _ = await asyncio.wait([task, waiter], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                task.cancel()
+                with self._lock:
+                    self.queue_timeouts += 1
+                raise HTTPException(status_code=503, detail=f"Too many pending {self.name} requests, try again later")
+            return await asyncio.wait_for(task, timeout)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            waiter.cancel()
+
+    async def _run(self, fn, args, kwargs, on_start=None):
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail=f"Too many pending {self.name} requests, try again later")
+            self.queued += 1
+
+        submitted = time.perf_counter()
+        state = {"started": False}
+        abandoned = threading.Event()
+
+        def call():
+            waited = time.perf_counter() - submitted
+            with self._lock:
+                state["started"] = True
+                self.queued -= 1
+                self.active += 1
+                self.wait_count += 1
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+            _abandoned.set(abandoned)
+            if on_start is not None:
+                on_start()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+
+        loop = asyncio.get_running_loop()
+        # Run in a copy of the caller's context so stage timings recorded in the thread reach its request
+        context = contextvars.copy_context()
+        try:
+            with timed_upstream(self.name, getattr(fn, "__name__", "call")):
+                result = await loop.run_in_executor(self._pool, context.run, call)
+        except asyncio.CancelledError:
+            # A cancelled call that never reached a worker is dropped from the queue
+            abandoned.set()
+            with self._lock:
+                if not state["started"]:
+                    self.queued -= 1
+            raise
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def stats(self):
+        """Snapshot of pool size, queue depth and wait-time counters"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "queue_timeouts": self.queue_timeouts,
+                "wait_time_avg_ms": round(self.wait_time_total / self.wait_count * 1000, 3) if self.wait_count else 0.0,
+                "wait_time_max_ms": round(self.wait_time_max * 1000, 3),
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _pool_setting(name: str, setting: str, default: int) -> int:
+    return int(os.getenv(f"{name.upper()}_POOL_{setting}", default))
+
+
+def _create_executor(name: str, default_workers: int, default_queue: int = 100) -> UpstreamExecutor:
+    return UpstreamExecutor(
+        name,
+        max_workers=_pool_setting(name, "SIZE", default_workers),
+        max_queue=_pool_setting(name, "MAX_QUEUE", default_queue),
+    )
+
+
+# One pool per upstream, sized with e.g. FORMS_POOL_SIZE / FORMS_POOL_MAX_QUEUE
+forms_executor = _create_executor("forms", 8)
+gmail_executor = _create_executor("gmail", 4)
+gemini_executor = _create_executor("gemini", 8)
+
+EXECUTORS = [forms_executor, gmail_executor, gemini_executor]
+
+
+def executor_stats():
+    """Stats for every upstream pool, keyed by upstream name"""
+    return {executor.name: executor.stats() for executor in EXECUTORS}
+
+
+def shutdown_executors():
+    for executor in EXECUTORS:
+        executor.shutdown()
@@ -0,0 +1,151 @@
+# extraction_cache.py - Content-addressed cache for Gemini quiz extraction
+
+import hashlib
+import json
+import logging
+import os
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Optional
+from cachetools import TTLCache
+from sqlalchemy import delete, func, select
+from models import AsyncSessionLocal, ExtractionCacheDB, QuizCreate
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_content(content: str) -> str:
+    """Normalize text so trivially different uploads of the same material share a key"""
+    content = unicodedata.normalize("NFC", content)
+    lines = [re.sub(r"\s+", " ", line).strip() for line in content.splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def make_cache_key(content: str, suggested_title: Optional[str], model: str, prompt_version: str) -> str:
+    """Hash of everything that influences the extraction result"""
+    payload = json.dumps(
+        [normalize_content(content), (suggested_title or "").strip(), model, prompt_version],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """
+    Two-tier cache of parsed QuizCreate results
+
+    An in-memory LRU (with TTL) sits in front of the extraction_cache table,
+    so results survive restarts and are shared between workers. The table is
+    trimmed to max_entries by least-recent access, and entries older than
+    ttl_seconds are ignored and removed.
+    """
+
+    def __init__(self, memory_size: int, ttl_seconds: int, max_entries: int, prune_every: int = 50):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._memory = TTLCache(maxsize=memory_size, ttl=ttl_seconds)
+        self._writes_since_prune = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.errors = 0
+
+    async def get(self, key: str) -> Optional[QuizCreate]:
+        quiz = self._memory.get(key)
+        if quiz is not None:
+            self.memory_hits += 1
+            return quiz.model_copy(deep=True)
+
+        try:
+            async with AsyncSessionLocal() as db:
+                row = await db.get(ExtractionCacheDB, key)
+                if row is None:
+                    self.misses += 1
+                    return None
+                if row.created_at < datetime.now() - timedelta(seconds=self.ttl_seconds):
+                    await db.delete(row)
+                    await db.commit()
+                    self.evictions += 1
+                    self.misses += 1
+                    return None
+                row.hits += 1
+                row.last_accessed_at = datetime.now()
+                quiz_json = row.quiz_json
+                await db.commit()
+        except Exception as e:
+            logger.warning("Extraction cache read failed: %s", e)
+            self.errors += 1
+            return None
+
+        quiz = QuizCreate.model_validate_json(quiz_json)
+        self._memory[key] = quiz
+        self.db_hits += 1
+        return quiz.model_copy(deep=True)
+
+    async def set(self, key: str, model: str, prompt_version: str, quiz: QuizCreate):
+        self._memory[key] = quiz.model_copy(deep=True)
+        now = datetime.now()
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.merge(ExtractionCacheDB(
+                    key=key,
+                    model=model,
+                    prompt_version=prompt_version,
+                    quiz_json=quiz.model_dump_json(),
+                    hits=0,
+                    created_at=now,
+                    last_accessed_at=now
+                ))
+                await db.commit()
+                self.writes += 1
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= self.prune_every:
+                    self._writes_since_prune = 0
+                    await self._prune(db)
+        except Exception as e:
+            logger.warning("Extraction cache write failed: %s", e)
+            self.errors += 1
+
+    async def _prune(self, db):
+        """Drop expired rows, then the least recently used rows beyond max_entries"""
+        expired = await db.execute(
+            delete(ExtractionCacheDB).where(
+                ExtractionCacheDB.created_at < datetime.now() - timedelta(seconds=self.ttl_seconds)
+            )
+        )
+        evicted = expired.rowcount or 0
+        count = (await db.execute(select(func.count()).select_from(ExtractionCacheDB))).scalar_one()
+        if count > self.max_entries:
+            oldest = (
+                select(ExtractionCacheDB.key)
+                .order_by(ExtractionCacheDB.last_accessed_at)
+                .limit(count - self.max_entries)
+            )
+            result = await db.execute(delete(ExtractionCacheDB).where(ExtractionCacheDB.key.in_(oldest)))
+            evicted += result.rowcount or 0
+        await db.commit()
+        self.evictions += evicted
+
+    def stats(self):
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
+
+
+extraction_cache = ExtractionCache(
+    memory_size=int(os.getenv("EXTRACTION_CACHE_MEMORY_SIZE", 256)),
+    ttl_seconds=int(os.getenv("EXTRACTION_CACHE_TTL", 7 * 24 * 3600)),
+    max_entries=int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", 10000)),
+)
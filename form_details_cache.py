@@ -0,0 +1,84 @@
+# form_details_cache.py - Revision-aware cache of parsed Google Form questions
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class FormDetailsCache:
+    """
+    Bounded LRU cache of parsed form questions keyed by form_id
+
+    Each entry keeps the form's revisionId. Within fresh_seconds an entry is
+    served as is; after that the caller revalidates it by fetching only the
+    revisionId, and an unchanged form is served from cache without being
+    downloaded and parsed again. Entries are looked up on the event loop and
+    revalidated or stored from worker threads, so access is locked.
+    """
+
+    def __init__(self, max_entries: int, fresh_seconds: float):
+        self.max_entries = max_entries
+        self.fresh_seconds = fresh_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_served = 0
+
+    def lookup(self, form_id: str):
+        """Return (questions, revision_id, is_fresh), or None when the form is not cached"""
+        with self._lock:
+            entry = self._entries.get(form_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(form_id)
+            questions, revision_id, fetched_at = entry
+            is_fresh = time.monotonic() - fetched_at < self.fresh_seconds
+            if is_fresh:
+                self.hits += 1
+            return copy.deepcopy(questions), revision_id, is_fresh
+
+    def revalidate(self, form_id: str, revision_id: str):
+        """Restart the freshness window and return the questions if the cached revision still matches, else None"""
+        with self._lock:
+            entry = self._entries.get(form_id)
+            if entry is None or not revision_id or entry[1] != revision_id:
+                return None
+            self._entries[form_id] = (entry[0], revision_id, time.monotonic())
+            self.revalidated += 1
+            return copy.deepcopy(entry[0])
+
+    def record_stale_served(self):
+        """Count a stale entry served because the form could not be revalidated"""
+        with self._lock:
+            self.stale_served += 1
+
+    def store(self, form_id: str, questions, revision_id):
+        with self._lock:
+            self._entries[form_id] = (copy.deepcopy(questions), revision_id, time.monotonic())
+            self._entries.move_to_end(form_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stale_served": self.stale_served,
+            }
+
+
+form_details_cache = FormDetailsCache(
+    max_entries=int(os.getenv("FORM_DETAILS_CACHE_SIZE", 1000)),
+    fresh_seconds=float(os.getenv("FORM_DETAILS_FRESH_SECONDS", 30)),
+)
@@ -1,116 +1,161 @@
 # Google Forms API setup
-import os
+import asyncio
+import base64
+import hashlib
 import json
-import json_repair
-import smtplib
-from fastapi import HTTPException, Depends
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from googleapiclient.discovery import build 
-from google.oauth2 import service_account
-from sqlalchemy.orm import Session
-from models import QuizDB, QuestionDB, get_db, QuizStatus, Question
-from typing import List
+import logging
+import os
+import re
+import time
 import uuid
+from dataclasses import dataclass, field
 from datetime import datetime
-import os
-import base64
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google import genai
-import os
-import json
+from typing import List, Optional
+import json_repair
 from fastapi import HTTPException
-from models import QuizCreate, Question
-
-# If modifying these SCOPES, delete the token.json file and re-authenticate
+from sqlalchemy import func, insert, literal_column, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from models import (
+    QuizDB, QuestionDB, AsyncSessionLocal, quiz_search,
+    QuizStatus, QuizCreate, Question, QuizResponse, QuizDetailResponse
+)
+from clients import client_registry
+from resilience import CircuitOpenError, forms_upstream, gemini_upstream
+from executors import call_abandoned
+from extraction_cache import extraction_cache, make_cache_key
+from chunking import split_into_chunks, dedupe_questions
+from form_details_cache import form_details_cache
+from singleflight import form_details_flight, gemini_flight
+from metrics import timed, timed_commit
+from logging_config import sampled, truncate
+
+logger = logging.getLogger(__name__)
+
+# Fraction of Gemini responses logged (truncated) when helpers logs at DEBUG
+MODEL_OUTPUT_LOG_SAMPLE_RATE = float(os.getenv("MODEL_OUTPUT_LOG_SAMPLE_RATE", 0.01))
 
 def get_gmail_service():
-    SCOPES = ["https://www.googleapis.com/auth/gmail.send"]
-    """Authenticate and return a Gmail API service instance."""
-    creds = None
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-    
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-            creds = flow.run_local_server(port=0)
+    """Return the shared Gmail API service instance."""
+    return client_registry.gmail_service()
 
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
+def build_invitation_message(recipients, quiz_title, form_url):
+    """Build the Gmail API message body inviting recipients to a quiz"""
+    sender_email = "your-email@gmail.com"  # Replace with your verified email
 
-    return build("gmail", "v1", credentials=creds)
+    # Create email message
+    msg = MIMEMultipart()
+    msg["From"] = sender_email
+    msg["To"] = ", ".join(recipients)
+    msg["Subject"] = f"Quiz Invitation: {quiz_title}"
 
-def send_email_notification(recipients, quiz_title, form_url):
-    """Send email notification with quiz link using Gmail API."""
-    try:
-        service = get_gmail_service()
-        sender_email = "your-email@gmail.com"  # Replace with your verified email
+    body = f"""
+    Hello,
 
-        # Create email message
-        msg = MIMEMultipart()
-        msg["From"] = sender_email
-        msg["To"] = ", ".join(recipients)
-        msg["Subject"] = f"Quiz Invitation: {quiz_title}"
+    You have been invited to take the quiz "{quiz_title}".
 
-        body = f"""
-        Hello,
+    Access the quiz here: {form_url}
 
-        You have been invited to take the quiz "{quiz_title}".
+    Thank you!
+    """
 
-        Access the quiz here: {form_url}
+    msg.attach(MIMEText(body, "plain"))
 
-        Thank you!
-        """
+    # Encode message in base64
+    raw_message = base64.urlsafe_b64encode(msg.as_bytes()).decode("utf-8")
+    return {"raw": raw_message}
 
-        msg.attach(MIMEText(body, "plain"))
+def send_quiz_invitation(recipient, quiz_title, form_url):
+    """Send one invitation email; raises on failure so callers can retry"""
+    service = get_gmail_service()
+    if not service:
+        raise RuntimeError("Gmail API not available")
+    message = build_invitation_message([recipient], quiz_title, form_url)
+    with timed("gmail_send"):
+        service.users().messages().send(userId="me", body=message).execute()
 
-        # Encode message in base64
-        raw_message = base64.urlsafe_b64encode(msg.as_bytes()).decode("utf-8")
-        message = {"raw": raw_message}
 
-        # Send email using Gmail API
-        service.users().messages().send(userId="me", body=message).execute()
+def setup_google_forms_api():
+    """Return the shared Google Forms service, or None if it is not configured"""
+    return client_registry.forms_service()
 
-        print("Email sent successfully!")
-        return True
 
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        return False
+FORMS_BATCH_SIZE = int(os.getenv("FORMS_BATCH_SIZE", 50))
 
+def get_form_url(form_id):
+    return f"https://docs.google.com/forms/d/{form_id}/edit"
 
-def setup_google_forms_api():
-    try:
-        SCOPES = ['https://www.googleapis.com/auth/forms.body','https://www.googleapis.com/auth/forms.body.readonly']
-        creds_file = os.environ.get('GOOGLE_CREDENTIALS_FILE', 'credentials2.json')
-        
-        # Check if credentials file exists
-        if not os.path.exists(creds_file):
-            print(f"Warning: Google credentials file {creds_file} not found.")
-            return None
-            
-        credentials = service_account.Credentials.from_service_account_file(
-            creds_file, scopes=SCOPES)
-        forms_service = build('forms', 'v1', credentials=credentials)
-        return forms_service
-    except Exception as e:
-        print(f"Error setting up Google Forms API: {e}")
-        return None
+def build_form_update_requests(questions):
+    """
+    batchUpdate requests that turn a new form into a quiz and add its questions
 
-# Initialize Google Forms service
-forms_service = setup_google_forms_api()
+    The quiz settings request comes first so the graded questions after it
+    are accepted within the same batchUpdate.
+    """
+    # Set the form to be a quiz
+    quiz_settings_request = {
+        'updateSettings': {
+            'settings': {
+                'quizSettings': {
+                    'isQuiz': True
+                }
+            },
+            'updateMask': 'quizSettings.isQuiz'
+        }
+    }
+    
+    # Add questions to the form
+    question_requests = []
+    for idx, question in enumerate(questions):
+        item_request = {
+            'createItem': {
+                'item': {
+                    'title': question.text,
+                    'questionItem': {
+                        'question': {
+                            'questionId' : f'{idx}',
+                            'required': True,
+                        "grading": {
+                            "pointValue": 1,
+                            "correctAnswers": {
+                                "answers":[{
+                                    "value": question.options[question.correct_answer_index]
+                                }]
+                            },
+                            "whenRight": {
+                                "text": "Correct"
+                            },
+                            "whenWrong": {
+                                "text": "Incorrect"
+                            }
+                        },
+                            'choiceQuestion': {
+                                'type': 'RADIO',
+                                'options': [{'value': option} for option in question.options],
+                                'shuffle': True
+                            },
 
+                        },
+                    }
+                },
+                'location': {
+                    'index': idx
+                }
+            }
+        }
+        question_requests.append(item_request)
+    
+    return [quiz_settings_request] + question_requests
 
 def create_google_form(title, description, questions):
-    """Create a Google Form using the Google Forms API"""
+    """Create a Google Form using the Google Forms API (one create plus one batchUpdate)"""
+    # Checked before anything is created, so a bad quiz leaves no empty form behind
+    error = validate_questions(questions)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    forms_service = setup_google_forms_api()
     if not forms_service:
         raise HTTPException(status_code=500, detail="Google Forms API not available")
     
@@ -122,225 +167,598 @@ def create_google_form(title, description, questions):
             }
         }
         
-        created_form = forms_service.forms().create(body=form_body).execute()
+        with timed("forms_create"):
+            created_form = forms_service.forms().create(body=form_body).execute()
         form_id = created_form['formId']
-        form_url = f"https://docs.google.com/forms/d/{form_id}/edit"
+        if call_abandoned():
+            raise HTTPException(status_code=504, detail="Google Form creation was abandoned after a timeout")
         
-        # Add questions to the form
-        question_requests = []
-        for idx, question in enumerate(questions):
-            item_request = {
-                'createItem': {
-                    'item': {
-                        'title': question.text,
-                        'questionItem': {
-                            'question': {
-                                'questionId' : f'{idx}',
-                                'required': True,
-                            "grading": {
-                                "pointValue": 1,
-                                "correctAnswers": {
-                                    "answers":[{
-                                        "value": question.options[question.correct_answer_index]
-                                    }]
-                                },
-                                "whenRight": {
-                                    "text": "Correct"
-                                },
-                                "whenWrong": {
-                                    "text": "Incorrect"
-                                }
-                            },
-                                'choiceQuestion': {
-                                    'type': 'RADIO',
-                                    'options': [{'value': option} for option in question.options],
-                                    'shuffle': True
-                                },
-
-                            },
-                        }
-                    },
-                    'location': {
-                        'index': idx
-                    }
-                }
-            }
-            question_requests.append(item_request)
-        
-        # Execute batch update to add questions
-        
-        # Set the form to be a quiz
-        quiz_settings_request = {
-            'updateSettings': {
-                'settings': {
-                    'quizSettings': {
-                        'isQuiz': True
-                    }
-                },
-                'updateMask': 'quizSettings.isQuiz'
-            }
-        }
-        
-        forms_service.forms().batchUpdate(
-            formId=form_id,
-            body={'requests': [quiz_settings_request]}
-        ).execute()
-        
-        if question_requests:
+        # Quiz settings and questions go out in a single batch update
+        with timed("forms_batch_update"):
             forms_service.forms().batchUpdate(
                 formId=form_id,
-                body={'requests': question_requests}
+                body={'requests': build_form_update_requests(questions)}
             ).execute()
-        return form_id, form_url
+        return form_id, get_form_url(form_id)
     except Exception as e:
-        print(f"Error creating Google Form: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to create Google Form: {str(e)}")
+        logger.warning("Error creating Google Form: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to create Google Form: {str(e)}") from e
 
+def _execute_forms_batch(forms_service, calls):
+    """
+    Send several Forms API calls as one batch HTTP request
 
-# Database operations
-def get_quiz_by_id(db: Session, quiz_id: str):
-    """Get a quiz by ID"""
-    return db.query(QuizDB).filter(QuizDB.id == quiz_id).first()
+    calls is a list of (key, http_request); returns {key: (response, exception)}.
+    """
+    results = {}
+    
+    def callback(request_id, response, exception):
+        results[request_id] = (response, exception)
+    
+    batch = forms_service.new_batch_http_request(callback=callback)
+    for key, request in calls:
+        batch.add(request, request_id=str(key))
+    with timed("forms_batch_http"):
+        batch.execute()
+    return {int(key): result for key, result in results.items()}
+
+def create_google_forms_batch(quizzes):
+    """
+    Create one Google Form per quiz using batched HTTP requests
+
+    Forms are created FORMS_BATCH_SIZE at a time: one batch request carries
+    all the creates, a second carries all the batchUpdates. Returns a list in
+    input order of (form_id, form_url, error) where error is None on success.
+    """
+    forms_service = setup_google_forms_api()
+    if not forms_service:
+        return [(None, None, "Google Forms API not available")] * len(quizzes)
+    
+    results = [(None, None, None)] * len(quizzes)
+    for start in range(0, len(quizzes), FORMS_BATCH_SIZE):
+        # Nobody is waiting for the results any more: don't create forms that would be orphaned
+        if call_abandoned():
+            break
+        chunk = range(start, min(start + FORMS_BATCH_SIZE, len(quizzes)))
+        try:
+            created = _execute_forms_batch(forms_service, [
+                (idx, forms_service.forms().create(body={'info': {'title': quizzes[idx].title}}))
+                for idx in chunk
+            ])
+            form_ids = {}
+            for idx in chunk:
+                response, exception = created.get(idx, (None, "No response in batch"))
+                if exception is not None:
+                    results[idx] = (None, None, f"Failed to create Google Form: {exception}")
+                else:
+                    form_ids[idx] = response['formId']
+            
+            if form_ids and not call_abandoned():
+                updated = _execute_forms_batch(forms_service, [
+                    (idx, forms_service.forms().batchUpdate(
+                        formId=form_id,
+                        body={'requests': build_form_update_requests(quizzes[idx].questions)}
+                    ))
+                    for idx, form_id in form_ids.items()
+                ])
+                for idx, form_id in form_ids.items():
+                    _, exception = updated.get(idx, (None, "No response in batch"))
+                    if exception is not None:
+                        results[idx] = (None, None, f"Failed to add questions to Google Form: {exception}")
+                    else:
+                        results[idx] = (form_id, get_form_url(form_id), None)
+        except Exception as e:
+            logger.warning("Error creating Google Forms batch: %s", e)
+            for idx in chunk:
+                if results[idx] == (None, None, None):
+                    results[idx] = (None, None, f"Failed to create Google Form: {str(e)}")
+    return [
+        result if result != (None, None, None) else (None, None, "Google Form creation was abandoned after a timeout")
+        for result in results
+    ]
 
-def get_all_quizzes(db: Session, status=None):
-    """Get all quizzes, optionally filtered by status"""
-    query = db.query(QuizDB).filter(QuizDB.status != QuizStatus.DELETED)
-    if status:
-        query = query.filter(QuizDB.status == status)
-    return query.all()
 
-def create_quiz_in_db(db: Session, quiz_data, form_id=None, form_url=None):
-    """Create a new quiz in the database"""
-    quiz_id = str(uuid.uuid4())
+# Database operations
+def encode_quiz_cursor(db_quiz) -> str:
+    """Encode the (created_at, id) keyset of a quiz as an opaque cursor"""
+    raw = json.dumps([db_quiz.created_at.isoformat(), db_quiz.id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_quiz_cursor(cursor: str):
+    """Decode a cursor produced by encode_quiz_cursor"""
+    try:
+        created_at, quiz_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(quiz_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Async database operations, used by the API routes
+def build_db_quiz(quiz_data, form_id=None, form_url=None):
+    """Build a new draft QuizDB with its questions attached, without adding it to a session"""
     current_time = datetime.now()
-    
-    db_quiz = QuizDB(
-        id=quiz_id,
+    return QuizDB(
+        id=str(uuid.uuid4()),
         title=quiz_data.title,
         description=quiz_data.description,
         status=QuizStatus.DRAFT,
         form_id=form_id,
         form_url=form_url,
         created_at=current_time,
-        updated_at=current_time
+        updated_at=current_time,
+        questions=[
+            QuestionDB(
+                text=question.text,
+                options=question.options,
+                correct_answer_index=question.correct_answer_index
+            )
+            for question in quiz_data.questions
+        ]
     )
+
+def _active_quizzes_query(status=None):
+    query = select(QuizDB).where(QuizDB.status != QuizStatus.DELETED)
+    if status:
+        query = query.where(QuizDB.status == status)
+    return query
+
+async def get_quiz_by_id_async(db: AsyncSession, quiz_id: str, include_questions: bool = False):
+    """Get a quiz by ID"""
+    query = select(QuizDB).where(QuizDB.id == quiz_id)
+    if include_questions:
+        query = query.options(selectinload(QuizDB.questions))
+    return (await db.execute(query)).scalar_one_or_none()
+
+async def get_quizzes_page_async(db: AsyncSession, status=None, limit: int = 50, cursor: Optional[str] = None,
+                                 include_questions: bool = False):
+    """
+    Get one page of quizzes, newest first, using keyset pagination on (created_at, id)
+
+    With include_questions, questions for the whole page are loaded in one
+    batched query; otherwise the questions table is not touched.
+    Returns a tuple of (quizzes, next_cursor, total).
+    """
+    query = _active_quizzes_query(status)
+    total = (await db.execute(
+        query.with_only_columns(func.count(QuizDB.id)).order_by(None)
+    )).scalar_one()
+
+    if cursor:
+        created_at, quiz_id = decode_quiz_cursor(cursor)
+        query = query.where(tuple_(QuizDB.created_at, QuizDB.id) < tuple_(created_at, quiz_id))
+    if include_questions:
+        query = query.options(selectinload(QuizDB.questions))
+
+    # Fetch one extra row to know whether another page exists
+    query = query.order_by(QuizDB.created_at.desc(), QuizDB.id.desc()).limit(limit + 1)
+    quizzes = (await db.execute(query)).scalars().all()
+    next_cursor = None
+    if len(quizzes) > limit:
+        quizzes = quizzes[:limit]
+        next_cursor = encode_quiz_cursor(quizzes[-1])
+    return quizzes, next_cursor, total
+
+# bm25 column weights for title, description and questions: title matches count most
+QUIZ_SEARCH_WEIGHTS = (10.0, 4.0, 1.0)
+QUIZ_SEARCH_SNIPPET_TOKENS = int(os.getenv("QUIZ_SEARCH_SNIPPET_TOKENS", 16))
+
+def build_search_match(q: str) -> Optional[str]:
+    """
+    FTS5 MATCH expression for free text: every word must match, and the last
+    one also matches as a prefix so partially typed words find results.
+    Words are quoted, so FTS5 operators in the input are treated as text.
+    """
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+async def search_quizzes_async(db: AsyncSession, q: str, status=None, limit: int = 20, offset: int = 0):
+    """Search quizzes and their questions; returns ([(quiz, score, snippet)], next_offset, total)"""
+    match = build_search_match(q)
+    if match is None:
+        raise HTTPException(status_code=400, detail="Search query must contain at least one word")
     
-    db.add(db_quiz)
-    db.commit()
-    
-    # Add questions
-    for question in quiz_data.questions:
-        db_question = QuestionDB(
-            quiz_id=quiz_id,
-            text=question.text,
-            options=json.dumps(question.options),
-            correct_answer_index=question.correct_answer_index
-        )
-        db.add(db_question)
+    fts = literal_column("quiz_search")
+    query = (
+        _active_quizzes_query(status)
+        .join(quiz_search, quiz_search.c.rowid == literal_column("quizzes.rowid"))
+        .where(fts.op("MATCH")(match))
+    )
+    total = (await db.execute(query.with_only_columns(func.count()))).scalar_one()
     
-    db.commit()
-    db.refresh(db_quiz)
+    # bm25() is lower for better matches
+    rank = func.bm25(fts, *QUIZ_SEARCH_WEIGHTS)
+    snippet = func.snippet(fts, -1, "<mark>", "</mark>", "…", QUIZ_SEARCH_SNIPPET_TOKENS)
+    rows = (await db.execute(
+        query.add_columns(rank, snippet).order_by(rank, QuizDB.id).offset(offset).limit(limit + 1)
+    )).all()
+    next_offset = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_offset = offset + limit
+    return [(quiz, -score, text) for quiz, score, text in rows], next_offset, total
+
+async def create_quiz_in_db_async(db: AsyncSession, quiz_data, form_id=None, form_url=None):
+    """Create a new quiz and its questions in a single transaction"""
+    db_quiz = build_db_quiz(quiz_data, form_id, form_url)
+    db.add(db_quiz)
+    with timed_commit():
+        await db.commit()
     return db_quiz
 
-def update_quiz_status(db: Session, quiz_id: str, new_status: QuizStatus):
+async def update_quiz_status_async(db: AsyncSession, quiz_id: str, new_status: QuizStatus):
     """Update the status of a quiz"""
-    db_quiz = get_quiz_by_id(db, quiz_id)
+    db_quiz = await get_quiz_by_id_async(db, quiz_id)
     if not db_quiz:
         return None
     
     db_quiz.status = new_status
     db_quiz.updated_at = datetime.now()
-    db.commit()
-    db.refresh(db_quiz)
+    with timed_commit():
+        await db.commit()
     return db_quiz
 
-def convert_db_quiz_to_response(db_quiz):
-    """Convert a DB quiz model to a response model"""
-    # Get questions
-    questions = []
-    for q in db_quiz.questions:
-        questions.append({
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 500))
+
+EXPORT_QUIZ_COLUMNS = (
+    QuizDB.id, QuizDB.title, QuizDB.description, QuizDB.status,
+    QuizDB.form_url, QuizDB.form_id, QuizDB.created_at, QuizDB.updated_at,
+)
+
+def _export_line(quiz_row, questions):
+    return json.dumps({
+        "id": quiz_row.id,
+        "title": quiz_row.title,
+        "description": quiz_row.description,
+        "status": quiz_row.status.value,
+        "form_url": quiz_row.form_url,
+        "form_id": quiz_row.form_id,
+        "created_at": quiz_row.created_at.isoformat(),
+        "updated_at": quiz_row.updated_at.isoformat(),
+        "questions": questions,
+    }, ensure_ascii=False) + "\n"
+
+async def export_quizzes_ndjson(status=None, updated_since=None, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Yield the quiz catalogue as NDJSON, one quiz (with its questions) per line
+
+    Quizzes are read from a server-side cursor batch_size rows at a time as
+    plain column rows (nothing accumulates in a session identity map), and
+    each batch's questions are fetched with one IN query, so memory use
+    depends on the batch size rather than the catalogue size. Without a
+    status filter, deleted quizzes are left out.
+    """
+    query = select(*EXPORT_QUIZ_COLUMNS)
+    if status:
+        query = query.where(QuizDB.status == status)
+    else:
+        query = query.where(QuizDB.status != QuizStatus.DELETED)
+    if updated_since:
+        query = query.where(QuizDB.updated_at >= updated_since)
+    query = query.order_by(QuizDB.created_at, QuizDB.id).execution_options(yield_per=batch_size)
+    
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query)
+        async for quiz_rows in result.partitions():
+            questions_by_quiz = {row.id: [] for row in quiz_rows}
+            question_rows = await db.execute(
+                select(QuestionDB.quiz_id, QuestionDB.text, QuestionDB.options, QuestionDB.correct_answer_index)
+                .where(QuestionDB.quiz_id.in_(list(questions_by_quiz)))
+                .order_by(QuestionDB.quiz_id, QuestionDB.id)
+            )
+            for question in question_rows:
+                questions_by_quiz[question.quiz_id].append({
+                    "text": question.text,
+                    "options": question.options,
+                    "correct_answer_index": question.correct_answer_index
+                })
+            # One chunk per batch keeps the number of writes to the client low
+            yield "".join(_export_line(row, questions_by_quiz[row.id]) for row in quiz_rows)
+
+def validate_quiz_data(quiz_data):
+    """Return an error message if the quiz can't be stored or turned into a form, else None"""
+    return validate_questions(quiz_data.questions)
+
+def validate_questions(questions):
+    """Return an error message if the questions can't be turned into a form, else None"""
+    if not questions:
+        return "Quiz has no questions"
+    for number, question in enumerate(questions, start=1):
+        if not question.options:
+            return f"Question {number} has no options"
+        if not 0 <= question.correct_answer_index < len(question.options):
+            return f"Question {number} has an out of range correct_answer_index"
+    return None
+
+async def create_quizzes_bulk_async(db: AsyncSession, quizzes):
+    """
+    Store many quizzes at once and create their Google Forms
+
+    Valid quizzes and all their questions are inserted in one transaction
+    with executemany-style bulk inserts. Forms are then created in batches,
+    with the batches running concurrently on the forms pool. A quiz whose
+    form fails is kept without form data, like create_quiz does.
+    Returns one result dict per input quiz, in order.
+    """
+    results = []
+    quiz_rows = []
+    question_rows = []
+    stored = []
+    current_time = datetime.now()
+    
+    for index, quiz_data in enumerate(quizzes):
+        error = validate_quiz_data(quiz_data)
+        if error:
+            results.append({"index": index, "success": False, "error": error})
+            continue
+        quiz_id = str(uuid.uuid4())
+        quiz_rows.append({
+            "id": quiz_id,
+            "title": quiz_data.title,
+            "description": quiz_data.description,
+            "status": QuizStatus.DRAFT,
+            "created_at": current_time,
+            "updated_at": current_time
+        })
+        question_rows.extend(
+            {
+                "quiz_id": quiz_id,
+                "text": question.text,
+                "options": question.options,
+                "correct_answer_index": question.correct_answer_index
+            }
+            for question in quiz_data.questions
+        )
+        result = {"index": index, "success": True, "quiz_id": quiz_id}
+        results.append(result)
+        stored.append((quiz_data, result))
+    
+    if not stored:
+        return results
+    
+    await db.execute(insert(QuizDB), quiz_rows)
+    await db.execute(insert(QuestionDB), question_rows)
+    with timed_commit():
+        await db.commit()
+    
+    # Each chunk is one create batch plus one batchUpdate batch; chunks run in parallel
+    chunks = [stored[i:i + FORMS_BATCH_SIZE] for i in range(0, len(stored), FORMS_BATCH_SIZE)]
+    chunk_results = await asyncio.gather(
+        *(forms_upstream.call(create_google_forms_batch, [quiz_data for quiz_data, _ in chunk]) for chunk in chunks),
+        return_exceptions=True
+    )
+    
+    form_updates = []
+    for chunk, forms in zip(chunks, chunk_results):
+        if isinstance(forms, Exception):
+            forms = [(None, None, str(getattr(forms, "detail", forms)))] * len(chunk)
+        for (_, result), (form_id, form_url, form_error) in zip(chunk, forms):
+            if form_error:
+                result["form_error"] = form_error
+                continue
+            result["form_id"] = form_id
+            result["form_url"] = form_url
+            form_updates.append({"id": result["quiz_id"], "form_id": form_id, "form_url": form_url})
+    
+    if form_updates:
+        await db.execute(update(QuizDB), form_updates)
+        with timed_commit():
+            await db.commit()
+    return results
+
+# Conditional GET support
+QUIZ_CDN_MAX_AGE = int(os.getenv("QUIZ_CDN_MAX_AGE", 30))
+# Browsers always revalidate; shared caches (the CDN) may serve a copy for QUIZ_CDN_MAX_AGE seconds
+QUIZ_CACHE_CONTROL = f"public, max-age=0, s-maxage={QUIZ_CDN_MAX_AGE}, must-revalidate"
+
+def compute_etag(*parts) -> str:
+    """Strong ETag over the given version components"""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches etag (weak comparison, as RFC 9110 requires)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def get_quiz_etag(db_quiz, includes) -> str:
+    """ETag for one quiz representation; updated_at changes on every mutation"""
+    return compute_etag("quiz", db_quiz.id, db_quiz.updated_at.isoformat(), ",".join(sorted(includes)))
+
+async def get_quiz_collection_version_async(db: AsyncSession, status=None):
+    """(count, latest updated_at) of the listed quizzes; changes whenever any of them is added or mutated"""
+    query = select(func.count(QuizDB.id), func.max(QuizDB.updated_at)).where(QuizDB.status != QuizStatus.DELETED)
+    if status:
+        query = query.where(QuizDB.status == status)
+    count, latest = (await db.execute(query)).one()
+    # Deleting a quiz removes it from the count, so the version changes then too
+    return count, latest.isoformat() if latest else None
+
+# Response fields that are not plain column copies, keyed by field name
+def _serialize_questions(db_quiz):
+    return [
+        {
             "text": q.text,
-            "options": json.loads(q.options),
+            "options": q.options,
             "correct_answer_index": q.correct_answer_index
-        })
+        }
+        for q in db_quiz.questions
+    ]
+
+QUIZ_FIELD_SERIALIZERS = {
+    "questions": _serialize_questions,
+}
+
+QUIZ_INCLUDES = {
+    "questions": QuizDetailResponse,
+}
+
+def parse_quiz_includes(include: Optional[str]):
+    """Parse a comma-separated ?include= value into a set of related fields"""
+    if not include:
+        return set()
+    includes = {part.strip() for part in include.split(",") if part.strip()}
+    unknown = includes - QUIZ_INCLUDES.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported include: {', '.join(sorted(unknown))}")
+    return includes
+
+def get_quiz_response_model(includes):
+    """Pick the response model matching the requested includes"""
+    if "questions" in includes:
+        return QuizDetailResponse
+    return QuizResponse
+
+def convert_db_quiz_to_response(db_quiz, response_model=QuizResponse):
+    """
+    Convert a DB quiz model to a response dict
+
+    Only the fields declared by response_model are built, so related rows
+    (e.g. questions) are never loaded or decoded unless the model asks for them.
+    """
+    data = {}
+    for name in response_model.model_fields:
+        serializer = QUIZ_FIELD_SERIALIZERS.get(name)
+        data[name] = serializer(db_quiz) if serializer else getattr(db_quiz, name)
+    return data
+
+def parse_form_questions(form):
+    """Extract questions, options, and answers from a Forms API form resource"""
+    questions = []
     
-    return {
-        "id": db_quiz.id,
-        "title": db_quiz.title,
-        "description": db_quiz.description,
-        "status": db_quiz.status,
-        "form_url": db_quiz.form_url,
-        "form_id": db_quiz.form_id,
-        "created_at": db_quiz.created_at,
-        "updated_at": db_quiz.updated_at,
-        "questions": questions
-    }
+    if 'items' in form:
+        for item in form['items']:
+            if 'questionItem' in item:
+                question_data = item['questionItem']['question']
+                question_text = item['title']
+                
+                # Handle different question types
+                if 'choiceQuestion' in question_data:
+                    options = []
+                    for option in question_data['choiceQuestion']['options']:
+                        options.append(option['value'])
+                    
+                    # For quizzes, answers may be available
+                    correct_answer_index = None
+                    if 'grading' in question_data:
+                        if 'correctAnswers' in question_data['grading']:
+                            correct_answers = question_data['grading']['correctAnswers']
+                            # Find index of correct answer in options
+                            for i, option in enumerate(options):
+                                if option in correct_answers:
+                                    correct_answer_index = i
+                                    break
+                    
+                    questions.append({
+                        "text": question_text,
+                        "options": options,
+                        "correct_answer_index": correct_answer_index
+                    })
+    
+    return questions
 
-def get_google_form_details(form_id):
-    """Retrieve questions, options, and answers from a Google Form by its ID"""
+async def get_google_form_details(form_id):
+    """
+    Retrieve questions, options, and answers from a Google Form by its ID
+
+    Parsed questions are cached with the form's revisionId. Fresh entries are
+    served straight from the cache, without going through the forms pool;
+    stale ones are revalidated by fetching only revisionId, and the full form
+    is downloaded and parsed again only when it changed. Concurrent requests
+    for the same form share one Forms API call. While the Forms circuit
+    breaker is open a stale entry is served rather than failing.
+    """
+    cached = form_details_cache.lookup(form_id)
+    revision_id = None
+    if cached is not None:
+        questions, revision_id, is_fresh = cached
+        if is_fresh:
+            return questions
+    try:
+        return await form_details_flight.do(
+            form_id, forms_upstream.call, fetch_google_form_details, form_id, revision_id, idempotent=True
+        )
+    except CircuitOpenError:
+        if cached is None:
+            raise
+        form_details_cache.record_stale_served()
+        return questions
+
+def fetch_google_form_details(form_id, cached_revision_id=None):
+    """
+    Fetch and cache a form's questions from the Forms API (blocking)
+
+    With cached_revision_id only the revisionId is fetched first, and the
+    cached questions are returned if the form has not changed since.
+    """
+    forms_service = setup_google_forms_api()
     if not forms_service:
         raise HTTPException(status_code=500, detail="Google Forms API not available")
     
     try:
-        # Get the form
-        form = forms_service.forms().get(formId=form_id).execute()
-        
-        # Extract questions, options, and answers
-        questions = []
-        
-        if 'items' in form:
-            for item in form['items']:
-                if 'questionItem' in item:
-                    question_data = item['questionItem']['question']
-                    question_text = item['title']
-                    
-                    # Handle different question types
-                    if 'choiceQuestion' in question_data:
-                        options = []
-                        for option in question_data['choiceQuestion']['options']:
-                            options.append(option['value'])
-                        
-                        # For quizzes, answers may be available
-                        correct_answer_index = None
-                        if 'grading' in question_data:
-                            if 'correctAnswers' in question_data['grading']:
-                                correct_answers = question_data['grading']['correctAnswers']
-                                # Find index of correct answer in options
-                                for i, option in enumerate(options):
-                                    if option in correct_answers:
-                                        correct_answer_index = i
-                                        break
-                        
-                        questions.append({
-                            "text": question_text,
-                            "options": options,
-                            "correct_answer_index": correct_answer_index
-                        })
+        if cached_revision_id:
+            with timed("forms_get_revision"):
+                current = forms_service.forms().get(formId=form_id, fields='revisionId').execute()
+            questions = form_details_cache.revalidate(form_id, current.get('revisionId'))
+            if questions is not None:
+                return questions
         
+        # Get the form
+        with timed("forms_get"):
+            form = forms_service.forms().get(formId=form_id).execute()
+        questions = parse_form_questions(form)
+        form_details_cache.store(form_id, questions, form.get('revisionId'))
         return questions
     except Exception as e:
-        print(f"Error retrieving Google Form: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to retrieve Google Form: {str(e)}")
+        logger.warning("Error retrieving Google Form %s: %s", form_id, e)
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve Google Form: {str(e)}") from e
 
 
 # Add this to helpers.py
 
-gemini_api_key = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = 'gemini-2.0-flash'
+# Bump whenever the extraction prompt changes so cached results are not reused
+PROMPT_VERSION = "1"
+
+def generate_content(**kwargs):
+    """Gemini generate_content, getting the client on the calling (pool) thread rather than the event loop"""
+    return client_registry.genai_client().models.generate_content(**kwargs)
 
-async def parse_quiz_with_gemini(content: str, suggested_title: str = None) -> QuizCreate:
+async def parse_quiz_with_gemini(content: str, suggested_title: str = None, use_cache: bool = True) -> QuizCreate:
     """
     Use Google's Gemini API to parse any text input and extract a quiz structure
     
     Parameters:
     - content: The text content to parse (can be structured or unstructured)
     - suggested_title: Optional title suggestion if none is found in the content
+    - use_cache: Reuse a cached extraction of the same content (pass False to force a fresh call)
     
     Returns a QuizCreate object or raises an HTTPException if parsing fails
     """
-    if not gemini_api_key:
+    if not client_registry.genai_configured():
         raise HTTPException(status_code=500, detail="Gemini API key not configured")
     
+    cache_key = make_cache_key(content, suggested_title, GEMINI_MODEL, PROMPT_VERSION)
+    if use_cache:
+        cached_quiz = await extraction_cache.get(cache_key)
+        if cached_quiz is not None:
+            return cached_quiz
+    
+    # Identical requests already being extracted share that Gemini call
+    return await gemini_flight.do(cache_key, _extract_and_cache, cache_key, content, suggested_title)
+
+async def _extract_and_cache(cache_key: str, content: str, suggested_title: str = None) -> QuizCreate:
+    quiz = await _extract_quiz_with_gemini(content, suggested_title)
+    await extraction_cache.set(cache_key, GEMINI_MODEL, PROMPT_VERSION, quiz)
+    return quiz
+
+async def _extract_quiz_with_gemini(content: str, suggested_title: str = None) -> QuizCreate:
     try:
         title_hint = None
         if suggested_title:
@@ -392,21 +810,25 @@ async def parse_quiz_with_gemini(content: str, suggested_title: str = None) -> Q
         """
         
 
-        client = genai.Client(api_key = gemini_api_key)
-        response = client.models.generate_content(
-            model='gemini-2.0-flash',
+        # Extraction has no side effects, so failed or timed-out calls are retried
+        response = await gemini_upstream.call(
+            generate_content,
+            model=GEMINI_MODEL,
             contents=prompt,
+            idempotent=True,
         )
 
-        # Use the response as a JSON string.
-        print(response.text)
+        # The raw model output is bulky: only a truncated sample is logged, at debug level
+        if logger.isEnabledFor(logging.DEBUG) and sampled(MODEL_OUTPUT_LOG_SAMPLE_RATE):
+            logger.debug("Gemini response", extra={"model_output": truncate(response.text), "output_chars": len(response.text)})
 
         # Make the API request
             
         if response == None:
             raise HTTPException(status_code=500, detail=f"Error from Gemini API: {response.text}")
             
-        quiz_data = json_repair.loads(response.text)
+        with timed("json_repair"):
+            quiz_data = json_repair.loads(response.text)
             
         # Extract the JSON from the response
         
@@ -432,5 +854,114 @@ async def parse_quiz_with_gemini(content: str, suggested_title: str = None) -> Q
         raise HTTPException(status_code=400, detail=f"Failed to parse quiz format: {str(e)}")
     except KeyError as e:
         raise HTTPException(status_code=400, detail=f"Missing required field in quiz data: {str(e)}")
+    except HTTPException:
+        # Timeouts (504) and an open circuit breaker (503) keep their status
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing quiz with Gemini API: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing quiz with Gemini API: {str(e)}") from e
+
+
+# Long documents are split and extracted chunk by chunk
+CHUNK_MAX_CHARS = int(os.getenv("EXTRACTION_CHUNK_MAX_CHARS", 12000))
+CHUNK_OVERLAP_CHARS = int(os.getenv("EXTRACTION_CHUNK_OVERLAP_CHARS", 800))
+CHUNK_CONCURRENCY = int(os.getenv("EXTRACTION_CHUNK_CONCURRENCY", 4))
+# Every chunk is a Gemini call, so texts needing more are rejected with 413
+MAX_EXTRACTION_CHUNKS = int(os.getenv("EXTRACTION_MAX_CHUNKS", 20))
+DUPLICATE_QUESTION_SIMILARITY = float(os.getenv("DUPLICATE_QUESTION_SIMILARITY", 0.85))
+
+@dataclass
+class ExtractionStats:
+    chunks: int = 1
+    chunk_latencies_ms: List[float] = field(default_factory=list)
+    failed_chunks: int = 0
+    questions_extracted: int = 0
+    duplicates_removed: int = 0
+    wall_time_ms: float = 0.0
+
+def check_extraction_length(content: str):
+    """Reject text that can't fit in MAX_EXTRACTION_CHUNKS chunks, without splitting it"""
+    if len(content) > MAX_EXTRACTION_CHUNKS * CHUNK_MAX_CHARS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Text is too long: at most {MAX_EXTRACTION_CHUNKS * CHUNK_MAX_CHARS} characters can be turned into one quiz"
+        )
+
+async def extract_quiz_from_content(content: str, suggested_title: str = None, use_cache: bool = True):
+    """
+    Extract a quiz from text of any length
+
+    Text longer than CHUNK_MAX_CHARS is split into overlapping chunks along
+    headings and paragraphs, the chunks are extracted concurrently (at most
+    CHUNK_CONCURRENCY at a time) and the questions are merged with
+    near-duplicates removed, off the event loop. Text needing more than
+    MAX_EXTRACTION_CHUNKS chunks is rejected with 413.
+    Returns (quiz_data, ExtractionStats).
+    """
+    started = time.perf_counter()
+    check_extraction_length(content)
+    chunks = split_into_chunks(content, CHUNK_MAX_CHARS, CHUNK_OVERLAP_CHARS)
+    if len(chunks) > MAX_EXTRACTION_CHUNKS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Text is too long: it splits into {len(chunks)} parts, at most {MAX_EXTRACTION_CHUNKS} are allowed"
+        )
+    stats = ExtractionStats(chunks=len(chunks), chunk_latencies_ms=[0.0] * len(chunks))
+    semaphore = asyncio.Semaphore(CHUNK_CONCURRENCY)
+    
+    async def extract_chunk(index, chunk):
+        async with semaphore:
+            chunk_started = time.perf_counter()
+            try:
+                return await parse_quiz_with_gemini(chunk, suggested_title, use_cache)
+            finally:
+                stats.chunk_latencies_ms[index] = round((time.perf_counter() - chunk_started) * 1000, 1)
+    
+    results = await asyncio.gather(
+        *(extract_chunk(index, chunk) for index, chunk in enumerate(chunks)),
+        return_exceptions=True
+    )
+    extracted = [result for result in results if not isinstance(result, BaseException)]
+    stats.failed_chunks = len(results) - len(extracted)
+    if not extracted:
+        raise results[0]
+    
+    questions = [question for quiz in extracted for question in quiz.questions]
+    # Pairwise comparison is quadratic in the number of questions
+    merged = await asyncio.to_thread(dedupe_questions, questions, DUPLICATE_QUESTION_SIMILARITY)
+    stats.questions_extracted = len(questions)
+    stats.duplicates_removed = len(questions) - len(merged)
+    stats.wall_time_ms = round((time.perf_counter() - started) * 1000, 1)
+    if len(chunks) > 1:
+        logger.info("Chunked extraction finished", extra={
+            "chunks": stats.chunks,
+            "failed_chunks": stats.failed_chunks,
+            "chunk_latencies_ms": stats.chunk_latencies_ms,
+            "questions_extracted": stats.questions_extracted,
+            "duplicates_removed": stats.duplicates_removed,
+            "wall_time_ms": stats.wall_time_ms,
+        })
+    
+    quiz_data = QuizCreate(
+        title=extracted[0].title,
+        description=extracted[0].description,
+        questions=merged
+    )
+    return quiz_data, stats
+
+async def run_quiz_creation_pipeline(content: str, suggested_title: str = None, use_cache: bool = True):
+    """
+    Extract a quiz from text with Gemini and create its Google Form
+
+    Returns (quiz_data, form_id, form_url, extraction_stats); the form fields
+    are None when the form could not be created, so the quiz can still be stored.
+    """
+    quiz_data, extraction_stats = await extract_quiz_from_content(content, suggested_title, use_cache)
+    
+    form_id, form_url = None, None
+    try:
+        form_id, form_url = await forms_upstream.call(create_google_form, quiz_data.title, quiz_data.description, quiz_data.questions)
+    except Exception as e:
+        # Log the error but continue (we'll store the quiz without form data)
+        logger.warning("Error creating Google Form: %s", e)
+    
+    return quiz_data, form_id, form_url, extraction_stats
@@ -0,0 +1,326 @@
+# idempotency.py - Idempotency-Key support for the quiz-creation endpoints
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.sqlite import insert
+from starlette.responses import JSONResponse
+from models import AsyncSessionLocal, IdempotencyKeyDB
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(query_string: bytes, content_type: str, body: bytes) -> str:
+    """Hash of what makes two requests "the same" for a given key and endpoint"""
+    # Multipart boundaries are usually random per attempt, so they don't count
+    if "boundary=" in content_type:
+        boundary = content_type.split("boundary=", 1)[1].split(";", 1)[0].strip('"')
+        body = body.replace(boundary.encode("latin-1"), b"")
+    digest = hashlib.sha256(query_string)
+    digest.update(b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Idempotency keys and their stored responses, in the idempotency_keys table
+
+    The first request with a key claims it by inserting a row, runs, and
+    saves its response; retries with the same key replay that response until
+    it expires. A retry that arrives while the first request is still running
+    waits for it: on the event the owner sets when it finishes if both are in
+    this process, otherwise by polling the table. Keys whose owner died
+    without finishing are taken over after lock_timeout seconds.
+    """
+
+    def __init__(self, ttl_seconds: int, wait_timeout: float, lock_timeout: int,
+                 poll_interval: float = 0.25, prune_every: int = 100):
+        self.ttl_seconds = ttl_seconds
+        self.wait_timeout = wait_timeout
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.prune_every = prune_every
+        self._running = {}
+        self._claims_since_prune = 0
+        self.claimed = 0
+        self.replayed = 0
+        self.waited = 0
+        self.mismatched = 0
+        self.timed_out = 0
+        self.released = 0
+
+    async def _claim(self, key: str, path: str, request_hash: str):
+        """Insert the key; returns (True, None) if this request now owns it, else (False, existing row)"""
+        now = datetime.now()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                insert(IdempotencyKeyDB)
+                .values(key=key, path=path, request_hash=request_hash, created_at=now,
+                        expires_at=now + timedelta(seconds=self.ttl_seconds))
+                .on_conflict_do_nothing()
+            )
+            if result.rowcount:
+                await db.commit()
+                return True, None
+            return False, await db.get(IdempotencyKeyDB, (key, path))
+
+    async def _discard(self, row):
+        """Delete an expired or abandoned row, unless another request has replaced it meanwhile"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(IdempotencyKeyDB).where(
+                    IdempotencyKeyDB.key == row.key,
+                    IdempotencyKeyDB.path == row.path,
+                    IdempotencyKeyDB.created_at == row.created_at,
+                )
+            )
+            await db.commit()
+
+    async def acquire(self, key: str, path: str, request_hash: str):
+        """
+        Claim a key or find its outcome
+
+        Returns ("claimed", None), ("replay", row), ("mismatch", row) when the
+        key was used for a different request, or ("in_progress", row) when the
+        first request did not finish within wait_timeout.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while True:
+            claimed, row = await self._claim(key, path, request_hash)
+            if claimed:
+                self._running[(key, path)] = asyncio.Event()
+                self.claimed += 1
+                await self._maybe_prune()
+                return "claimed", None
+            if row is None:
+                # Released or discarded between the insert and the read
+                continue
+            now = datetime.now()
+            if row.request_hash != request_hash:
+                self.mismatched += 1
+                return "mismatch", row
+            if row.expires_at < now:
+                await self._discard(row)
+                continue
+            if row.completed_at is not None:
+                self.replayed += 1
+                return "replay", row
+            if (key, path) not in self._running and row.created_at < now - timedelta(seconds=self.lock_timeout):
+                logger.warning("Taking over idempotency key %s on %s abandoned since %s", key, path, row.created_at)
+                await self._discard(row)
+                continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.timed_out += 1
+                return "in_progress", row
+            if not waited:
+                waited = True
+                self.waited += 1
+            event = self._running.get((key, path))
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(min(self.poll_interval, remaining))
+
+    async def complete(self, key: str, path: str, status_code: int, headers, body: bytes):
+        """Store the response for replay and wake waiting retries"""
+        now = datetime.now()
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(IdempotencyKeyDB)
+                    .where(IdempotencyKeyDB.key == key, IdempotencyKeyDB.path == path)
+                    .values(
+                        status_code=status_code,
+                        response_headers=json.dumps(headers),
+                        response_body=body,
+                        completed_at=now,
+                        expires_at=now + timedelta(seconds=self.ttl_seconds),
+                    )
+                )
+                await db.commit()
+        finally:
+            self._finish(key, path)
+
+    async def release(self, key: str, path: str):
+        """Give the key up after a failure so a retry runs the request again"""
+        self.released += 1
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    delete(IdempotencyKeyDB).where(
+                        IdempotencyKeyDB.key == key,
+                        IdempotencyKeyDB.path == path,
+                        IdempotencyKeyDB.completed_at.is_(None),
+                    )
+                )
+                await db.commit()
+        finally:
+            self._finish(key, path)
+
+    def _finish(self, key: str, path: str):
+        event = self._running.pop((key, path), None)
+        if event is not None:
+            event.set()
+
+    async def _maybe_prune(self):
+        self._claims_since_prune += 1
+        if self._claims_since_prune < self.prune_every:
+            return
+        self._claims_since_prune = 0
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(IdempotencyKeyDB).where(IdempotencyKeyDB.expires_at < datetime.now()))
+            await db.commit()
+
+    def stats(self):
+        return {
+            "running": len(self._running),
+            "claimed": self.claimed,
+            "replayed": self.replayed,
+            "waited": self.waited,
+            "mismatched": self.mismatched,
+            "timed_out": self.timed_out,
+            "released": self.released,
+        }
+
+
+idempotency_store = IdempotencyStore(
+    ttl_seconds=int(os.getenv("IDEMPOTENCY_TTL", 24 * 3600)),
+    wait_timeout=float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", 120)),
+    lock_timeout=int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 600)),
+)
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware making POSTs to the given paths safe to retry
+
+    Requests without an Idempotency-Key header pass straight through. With
+    one, the first request runs normally and its response (anything below
+    500) is stored; retries get the stored response back with an
+    Idempotent-Replayed: true header. Reusing a key for a different request
+    body is rejected with 422, and a retry whose first attempt is still
+    running after the wait timeout gets 409. The body is buffered to be
+    fingerprinted, so bodies over max_body_bytes are rejected with 413.
+    """
+
+    def __init__(self, app, paths, max_body_bytes: int, store: IdempotencyStore = idempotency_store):
+        self.app = app
+        self.paths = set(paths)
+        self.max_body_bytes = max_body_bytes
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        key = headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = key.decode("latin-1").strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse({"detail": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"}, status_code=400)
+            await response(scope, receive, send)
+            return
+
+        body = await self._read_body(receive, headers)
+        if body is None:
+            response = JSONResponse({"detail": f"Request body is larger than {self.max_body_bytes} bytes"}, status_code=413)
+            await response(scope, receive, send)
+            return
+        request_hash = request_fingerprint(
+            scope.get("query_string", b""), headers.get(b"content-type", b"").decode("latin-1"), body
+        )
+        path = scope["path"]
+        outcome, row = await self.store.acquire(key, path, request_hash)
+        if outcome == "replay":
+            await self._replay(row, send)
+            return
+        if outcome == "mismatch":
+            response = JSONResponse({"detail": "Idempotency-Key was already used for a different request"}, status_code=422)
+            await response(scope, receive, send)
+            return
+        if outcome == "in_progress":
+            response = JSONResponse(
+                {"detail": "A request with this Idempotency-Key is still in progress"},
+                status_code=409, headers={"Retry-After": "5"}
+            )
+            await response(scope, receive, send)
+            return
+
+        await self._run(scope, receive, send, body, key, path)
+
+    async def _read_body(self, receive, headers):
+        """The whole request body, or None as soon as it exceeds max_body_bytes"""
+        content_length = headers.get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            return None
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def _run(self, scope, receive, send, body, key, path):
+        body_sent = False
+
+        async def replay_body():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        response = {"status": None, "headers": [], "body": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [
+                    [name.decode("latin-1"), value.decode("latin-1")] for name, value in message.get("headers", [])
+                ]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_body, capture)
+        except BaseException:
+            await self.store.release(key, path)
+            raise
+        if response["status"] is None or response["status"] >= 500:
+            await self.store.release(key, path)
+        else:
+            await self.store.complete(key, path, response["status"], response["headers"], b"".join(response["body"]))
+
+    async def _replay(self, row, send):
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(row.response_headers)]
+        headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": row.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": row.response_body or b""})
@@ -0,0 +1,215 @@
+# jobs.py - Background quiz-creation jobs
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import AsyncSessionLocal, JobDB, JobStatus
+from helpers import run_quiz_creation_pipeline, build_db_quiz
+
+logger = logging.getLogger(__name__)
+
+MAX_JOB_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
+
+class JobWorker:
+    """
+    In-process worker pool for quiz-creation jobs
+
+    Jobs are persisted in the jobs table before they are queued, so pending
+    and interrupted jobs are picked up again from the database.
+    A worker claims a job with a conditional UPDATE that also sets a lease,
+    renewed while the job runs, so a job is only ever run by one worker even
+    with several processes sharing the database. A periodic sweep submits
+    pending jobs and running jobs whose lease has expired, so a job whose
+    worker died is taken over once its lease runs out.
+    """
+
+    def __init__(self, concurrency: int, lease_seconds: int, sweep_seconds: float):
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.sweep_seconds = sweep_seconds
+        self._semaphore = None
+        self._tasks = set()
+        self._active = set()
+        self._sweeper = None
+
+    async def start(self):
+        """Resume every claimable job, then keep sweeping for abandoned ones"""
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        resumed = await self.sweep()
+        if resumed:
+            logger.info("Resuming %d unfinished quiz jobs", resumed)
+        self._sweeper = asyncio.create_task(self._sweep_periodically())
+
+    async def stop(self):
+        """Cancel running jobs; they are handed back as pending and resume on next start"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def submit(self, job_id: str):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if job_id in self._active:
+            return
+        self._active.add(job_id)
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._active.discard(job_id))
+
+    async def sweep(self) -> int:
+        """Submit pending jobs and running jobs with an expired lease; returns how many were submitted"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(JobDB.id).where(_claimable(datetime.now())).order_by(JobDB.created_at)
+            )
+            job_ids = [job_id for job_id in result.scalars().all() if job_id not in self._active]
+        for job_id in job_ids:
+            self.submit(job_id)
+        return len(job_ids)
+
+    async def _sweep_periodically(self):
+        while True:
+            await asyncio.sleep(self.sweep_seconds)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Quiz job sweep failed")
+
+    async def _claim(self, job_id: str) -> bool:
+        """Mark the job running under a fresh lease; False if another worker has it or it is done"""
+        now = datetime.now()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(JobDB)
+                .where(JobDB.id == job_id, _claimable(now))
+                .values(
+                    status=JobStatus.RUNNING,
+                    attempts=JobDB.attempts + 1,
+                    lease_until=now + timedelta(seconds=self.lease_seconds),
+                    updated_at=now,
+                )
+            )
+            await db.commit()
+            return result.rowcount == 1
+
+    async def _renew_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(JobDB)
+                    .where(JobDB.id == job_id, JobDB.status == JobStatus.RUNNING)
+                    .values(lease_until=datetime.now() + timedelta(seconds=self.lease_seconds))
+                )
+                await db.commit()
+
+    async def _release(self, job_id: str):
+        """Hand an interrupted job back so the next sweep picks it up straight away"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(JobDB)
+                .where(JobDB.id == job_id, JobDB.status == JobStatus.RUNNING)
+                .values(status=JobStatus.PENDING, lease_until=None, updated_at=datetime.now())
+            )
+            await db.commit()
+
+    async def _run(self, job_id: str):
+        async with self._semaphore:
+            if not await self._claim(job_id):
+                return
+            lease = asyncio.create_task(self._renew_lease(job_id))
+            try:
+                await self._process(job_id)
+            except asyncio.CancelledError:
+                await asyncio.shield(self._release(job_id))
+                raise
+            finally:
+                lease.cancel()
+
+    async def _process(self, job_id: str):
+        async with AsyncSessionLocal() as db:
+            job = await db.get(JobDB, job_id)
+            if job.attempts > MAX_JOB_ATTEMPTS:
+                await _finish_job(db, job, JobStatus.FAILED, error="Gave up after repeated interruptions")
+                return
+
+            try:
+                quiz_data, form_id, form_url, _ = await run_quiz_creation_pipeline(
+                    job.content, job.suggested_title, use_cache=not job.no_cache
+                )
+            except HTTPException as e:
+                await _finish_job(db, job, JobStatus.FAILED, error=str(e.detail))
+                return
+            except Exception as e:
+                logger.exception("Quiz job %s failed", job_id)
+                await _finish_job(db, job, JobStatus.FAILED, error=str(e))
+                return
+
+            # The quiz and the job result are committed together
+            db_quiz = build_db_quiz(quiz_data, form_id, form_url)
+            db.add(db_quiz)
+            await _finish_job(db, job, JobStatus.SUCCEEDED, quiz_id=db_quiz.id)
+
+
+def _claimable(now: datetime):
+    """Jobs no worker holds: pending, or running under an expired lease"""
+    return or_(
+        JobDB.status == JobStatus.PENDING,
+        and_(
+            JobDB.status == JobStatus.RUNNING,
+            or_(JobDB.lease_until.is_(None), JobDB.lease_until < now),
+        ),
+    )
+
+
+async def _finish_job(db: AsyncSession, job: JobDB, status: JobStatus, quiz_id=None, error=None):
+    job.status = status
+    job.quiz_id = quiz_id
+    job.error = error
+    job.lease_until = None
+    job.updated_at = datetime.now()
+    await db.commit()
+
+
+job_worker = JobWorker(
+    concurrency=int(os.getenv("JOB_WORKERS", 4)),
+    lease_seconds=int(os.getenv("JOB_LEASE_SECONDS", 300)),
+    sweep_seconds=float(os.getenv("JOB_SWEEP_SECONDS", 30)),
+)
+
+
+async def enqueue_quiz_job(db: AsyncSession, kind: str, content: str, suggested_title=None, no_cache=False):
+    """Persist a quiz-creation job and hand it to the worker pool"""
+    current_time = datetime.now()
+    job = JobDB(
+        id=str(uuid.uuid4()),
+        kind=kind,
+        status=JobStatus.PENDING,
+        content=content,
+        suggested_title=suggested_title,
+        no_cache=no_cache,
+        attempts=0,
+        created_at=current_time,
+        updated_at=current_time
+    )
+    db.add(job)
+    await db.commit()
+    job_worker.submit(job.id)
+    return job
+
+
+async def get_job_by_id(db: AsyncSession, job_id: str):
+    """Get a job by ID"""
+    return await db.get(JobDB, job_id)
@@ -0,0 +1,191 @@
+# logging_config.py - Structured, queue-based logging with request-id correlation
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from metrics import Counter, registry, record_stage
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Per-module overrides, e.g. "helpers=DEBUG,email_fanout=WARNING"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+LOG_STREAM = os.getenv("LOG_STREAM", "stdout")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Large payloads (model output, request bodies) are cut to this many characters
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", 500))
+
+log_records = registry.register(Counter(
+    "log_records_total", "Log records accepted, by level", ("level",)))
+log_bytes = registry.register(Counter(
+    "log_bytes_total", "Bytes of formatted log output written"))
+log_dropped = registry.register(Counter(
+    "log_dropped_total", "Log records dropped because the log queue was full"))
+log_emit_seconds = registry.register(Counter(
+    "log_emit_seconds_total", "Time callers spent handing records to the log queue"))
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed in `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+def truncate(text, limit: int = None) -> str:
+    """Cut text to limit characters, noting how much was left out"""
+    limit = LOG_PAYLOAD_MAX_CHARS if limit is None else limit
+    text = str(text)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more chars]"
+
+
+def sampled(rate: float) -> bool:
+    """True for roughly `rate` of calls; used to log only a sample of bulky records"""
+    return rate >= 1 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with timestamp, level, logger, message, request id and extras"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _CountingStreamHandler(logging.StreamHandler):
+    def emit(self, record):
+        try:
+            line = self.format(record)
+            self.stream.write(line + self.terminator)
+            self.flush()
+            log_bytes.inc(len(line) + 1)
+        except Exception:
+            self.handleError(record)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread without ever blocking the caller
+
+    Only the message is rendered on the calling thread; JSON formatting and
+    the write happen on the listener thread. When the queue is full the
+    record is dropped and counted.
+    """
+
+    def prepare(self, record):
+        record.request_id = request_id_var.get()
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_dropped.inc()
+
+    def emit(self, record):
+        started = time.perf_counter()
+        try:
+            self.enqueue(self.prepare(record))
+            log_records.inc(level=record.levelname)
+        except Exception:
+            self.handleError(record)
+        elapsed = time.perf_counter() - started
+        log_emit_seconds.inc(elapsed)
+        # Shows up as the "log" stage in Server-Timing
+        record_stage("log", elapsed)
+
+
+_listener = None
+
+
+def _parse_levels(spec: str):
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    """Route all logging through a bounded queue to a background writer thread (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = sys.stderr if LOG_STREAM == "stderr" else sys.stdout
+    output = _CountingStreamHandler(stream)
+    if LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    root.handlers = [_NonBlockingQueueHandler(log_queue)]
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    # Flush whatever is still queued when the process exits
+    atexit.register(_listener.stop)
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving each request an id for log correlation
+
+    An incoming X-Request-ID header is reused, otherwise a new id is made.
+    The id is echoed in the X-Request-ID response header and attached to
+    every log record written while handling the request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
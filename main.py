@@ -1,17 +1,49 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from routes import router
-from models import Base, engine
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+# Before the app modules are imported: they read their settings from the environment
 load_dotenv()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from routes import router, MAX_UPLOAD_BYTES
+from models import engine, async_engine
+from migrations import run_migrations
+from executors import shutdown_executors
+from clients import client_registry
+from jobs import job_worker
+from email_fanout import email_fanout
+from metrics import MetricsMiddleware
+from logging_config import configure_logging, RequestIdMiddleware
+from idempotency import IdempotencyMiddleware
+
+# Importing this module has no side effects: logging, the schema and the
+# upstream clients are all set up when the app starts
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    # Create or upgrade the database schema
+    run_migrations(engine)
+    # Build the Google and Gemini clients in the background so the first request doesn't pay for it
+    if os.getenv("PREWARM_CLIENTS", "true").lower() == "true":
+        asyncio.get_running_loop().run_in_executor(None, client_registry.warm_up)
+    # Pick up quiz jobs left unfinished by a previous process
+    await job_worker.start()
+    await email_fanout.start()
+    yield
+    await email_fanout.stop()
+    await job_worker.stop()
+    shutdown_executors()
+    # Close pooled aiosqlite connections (and their worker threads)
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Google Forms Quiz System API",
     description="API for creating and managing quizzes using Google Forms",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -24,6 +56,19 @@ app.add_middleware(
 
 app.include_router(router)
 
+# Retries of these endpoints carrying the same Idempotency-Key get the first response back.
+# Bodies are buffered to compare retries: the cap leaves room for multipart framing around an upload
+app.add_middleware(
+    IdempotencyMiddleware,
+    paths=["/quizzes/", "/quizzes/from-text", "/quizzes/from-file"],
+    max_body_bytes=MAX_UPLOAD_BYTES + 64 * 1024,
+)
+
+# The last middleware added runs first: request ids are set before anything
+# logs, and Server-Timing and latency cover the rest of the request
+app.add_middleware(MetricsMiddleware, routes=app.routes)
+app.add_middleware(RequestIdMiddleware)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,320 @@
+# metrics.py - Request stage timing, Server-Timing and Prometheus metrics
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from starlette.routing import Match
+
+# Seconds; covers sub-millisecond SQLite statements up to long Gemini calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def _render_sample(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics plus collector callbacks, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """Register fn() returning [(name, type, documentation, [(labels_dict, value), ...]), ...]"""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, type_name, documentation, samples in collect():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {type_name}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def stats_collector(prefix: str, label: str, get_stats):
+    """
+    Collector exposing {name: {stat: number}} snapshots (executor_stats() and
+    the like) as one gauge per stat, labelled by name
+    """
+    def collect():
+        by_stat = {}
+        for name, stats in (get_stats() or {}).items():
+            for stat, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    by_stat.setdefault(stat, []).append(({label: name}, value))
+        return [(f"{prefix}_{stat}", "gauge", f"{prefix} {stat}", samples) for stat, samples in by_stat.items()]
+    return collect
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status code", ("method", "route", "status")))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response starts", ("method", "route")))
+http_requests_in_progress = registry.register(Gauge(
+    "http_requests_in_progress", "HTTP requests currently being handled", ("method", "route")))
+upstream_call_duration = registry.register(Histogram(
+    "upstream_call_duration_seconds", "Upstream call latency including pool queueing", ("upstream", "operation")))
+upstream_errors = registry.register(Counter(
+    "upstream_errors_total", "Upstream calls that raised", ("upstream", "operation")))
+upstream_calls_in_progress = registry.register(Gauge(
+    "upstream_calls_in_progress", "Upstream calls queued or running", ("upstream",)))
+db_operation_duration = registry.register(Histogram(
+    "db_operation_duration_seconds", "SQL statement and commit latency", ("operation",)))
+stage_duration = registry.register(Histogram(
+    "stage_duration_seconds", "Latency of in-process request stages such as JSON repair", ("stage",)))
+
+
+# Per-request stage timings
+
+class RequestTimings:
+    """Durations recorded for one request, summed per stage"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        # Upstream pool threads record into the same request
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            total, count = self.stages.get(stage, (0.0, 0))
+            self.stages[stage] = (total + seconds, count + 1)
+
+    def server_timing(self) -> str:
+        """Server-Timing header value; "app" is the whole request up to the response start"""
+        entries = [
+            f'{stage};dur={total * 1000:.1f};desc="{count}x"' if count > 1 else f"{stage};dur={total * 1000:.1f}"
+            for stage, (total, count) in self.stages.items()
+        ]
+        entries.append(f"app;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    """Add a duration to the current request's Server-Timing (no-op outside a request)"""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    """Time a block as a request stage and in stage_duration_seconds"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_duration.observe(elapsed, stage=stage)
+        record_stage(stage, elapsed)
+
+
+@contextmanager
+def timed_upstream(upstream: str, operation: str):
+    """Time an upstream call: latency histogram, error counter, in-flight gauge and Server-Timing stage"""
+    upstream_calls_in_progress.inc(upstream=upstream)
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        upstream_errors.inc(upstream=upstream, operation=operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        upstream_calls_in_progress.dec(upstream=upstream)
+        upstream_call_duration.observe(elapsed, upstream=upstream, operation=operation)
+        record_stage(upstream, elapsed)
+
+
+def record_db_operation(operation: str, seconds: float):
+    db_operation_duration.observe(seconds, operation=operation)
+    record_stage("db", seconds)
+
+
+@contextmanager
+def timed_commit():
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_db_operation("commit", time.perf_counter() - started)
+
+
+def instrument_engine(engine):
+    """Time every SQL statement run on a (sync) engine, labelled by statement verb"""
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+        record_db_operation(verb, time.perf_counter() - started)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route HTTP metrics and adding Server-Timing
+
+    Stage timings recorded with timed()/timed_upstream() during the request
+    are reported in the Server-Timing header. Routes are labelled by their
+    path template (e.g. /quizzes/{quiz_id}) to keep label cardinality low.
+    """
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    def _route_label(self, scope) -> str:
+        partial = None
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        return partial or "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        labels = {"method": scope["method"], "route": self._route_label(scope)}
+        http_requests_in_progress.inc(**labels)
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                http_request_duration.observe(time.perf_counter() - timings.started, **labels)
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            http_requests_in_progress.dec(**labels)
+            http_requests.inc(status=status["code"], **labels)
+            _current_timings.reset(token)
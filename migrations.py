@@ -0,0 +1,169 @@
+# migrations.py - Versioned schema migrations for the SQLite database
+
+import json
+import logging
+from sqlalchemy import text
+from models import Base, QuizDB, QuestionDB, OptionList, OPTION_SEPARATOR
+
+logger = logging.getLogger(__name__)
+
+# The schema version is kept in SQLite's PRAGMA user_version. Each migration
+# must also be safe on a database freshly created at the current schema,
+# because the baseline creates tables from today's models.
+#
+# Released databases have only the quizzes and questions tables, at
+# user_version 0. Every other table is new in this schema and is created
+# whole by the baseline, so migrations only need to upgrade those two.
+
+
+def _baseline(conn):
+    """Create any missing tables"""
+    Base.metadata.create_all(bind=conn, checkfirst=True)
+
+
+def _add_list_indexes(conn):
+    """Composite indexes for status-filtered lists and question loading"""
+    for table in (QuizDB.__table__, QuestionDB.__table__):
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+    # Refresh planner statistics so the new indexes are picked up
+    conn.execute(text("ANALYZE"))
+
+
+def _json_options(value: str):
+    """The options of a row still holding a JSON array, or None if it is already in OptionList form"""
+    # json.dumps escapes control characters, so a separator means OptionList
+    if not value.startswith("[") or OPTION_SEPARATOR in value:
+        return None
+    try:
+        options = json.loads(value)
+    except ValueError:
+        # e.g. a single option that starts with "["
+        return None
+    if isinstance(options, list) and all(isinstance(option, str) for option in options):
+        return options
+    return None
+
+
+def _compact_question_options(conn, batch_size: int = 1000):
+    """Re-encode question options from JSON arrays to OptionList"""
+    encode = OptionList().process_bind_param
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, options FROM questions WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": batch_size}
+        ).all()
+        if not rows:
+            break
+        # Rows already in OptionList form are left alone, so running this twice is harmless
+        updates = []
+        for row in rows:
+            options = _json_options(row.options)
+            if options is not None:
+                updates.append({"id": row.id, "options": encode(options, None)})
+        if updates:
+            conn.execute(text("UPDATE questions SET options = :options WHERE id = :id"), updates)
+        last_id = rows[-1].id
+
+
+# One quiz_search row per quiz (rowid = quizzes.rowid), kept in step by triggers.
+# Question text and options are concatenated into the questions column.
+_QUESTIONS_TEXT = "{q}.text || ' ' || replace(coalesce({q}.options, ''), char(31), ' ')"
+_QUIZ_QUESTIONS_TEXT = (
+    "coalesce((SELECT group_concat(" + _QUESTIONS_TEXT.format(q="questions") + ", ' ') "
+    "FROM questions WHERE questions.quiz_id = {quiz_id}), '')"
+)
+_REINDEX_QUESTIONS = (
+    "UPDATE quiz_search SET questions = " + _QUIZ_QUESTIONS_TEXT + " "
+    "WHERE rowid = (SELECT rowid FROM quizzes WHERE id = {quiz_id});"
+)
+
+QUIZ_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS quiz_search USING fts5(
+        title, description, questions,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS quiz_search_quiz_insert AFTER INSERT ON quizzes BEGIN
+        INSERT INTO quiz_search (rowid, title, description, questions)
+        VALUES (NEW.rowid, NEW.title, coalesce(NEW.description, ''), '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS quiz_search_quiz_update AFTER UPDATE OF title, description ON quizzes BEGIN
+        UPDATE quiz_search SET title = NEW.title, description = coalesce(NEW.description, '')
+        WHERE rowid = NEW.rowid;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS quiz_search_quiz_delete AFTER DELETE ON quizzes BEGIN
+        DELETE FROM quiz_search WHERE rowid = OLD.rowid;
+    END""",
+    # New questions are appended rather than re-aggregating the whole quiz
+    """CREATE TRIGGER IF NOT EXISTS quiz_search_question_insert AFTER INSERT ON questions BEGIN
+        UPDATE quiz_search SET questions = ltrim(questions || ' ' || """ + _QUESTIONS_TEXT.format(q="NEW") + """)
+        WHERE rowid = (SELECT rowid FROM quizzes WHERE id = NEW.quiz_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS quiz_search_question_update AFTER UPDATE OF text, options, quiz_id ON questions BEGIN
+        """ + _REINDEX_QUESTIONS.format(quiz_id="OLD.quiz_id") + """
+        """ + _REINDEX_QUESTIONS.format(quiz_id="NEW.quiz_id") + """
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS quiz_search_question_delete AFTER DELETE ON questions BEGIN
+        """ + _REINDEX_QUESTIONS.format(quiz_id="OLD.quiz_id") + """
+    END""",
+]
+
+
+def _add_quiz_search(conn):
+    """FTS5 index over quiz titles, descriptions, question text and options"""
+    for statement in QUIZ_SEARCH_DDL:
+        conn.exec_driver_sql(statement)
+    # Index the quizzes that already exist
+    conn.exec_driver_sql("DELETE FROM quiz_search")
+    conn.exec_driver_sql(
+        "INSERT INTO quiz_search (rowid, title, description, questions) "
+        "SELECT rowid, title, coalesce(description, ''), " + _QUIZ_QUESTIONS_TEXT.format(quiz_id="quizzes.id") + " "
+        "FROM quizzes"
+    )
+    conn.exec_driver_sql("INSERT INTO quiz_search (quiz_search) VALUES ('optimize')")
+
+
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "quiz list and question indexes", _add_list_indexes),
+    (3, "compact question options", _compact_question_options),
+    (4, "quiz full-text search", _add_quiz_search),
+]
+
+
+def get_schema_version(conn) -> int:
+    return conn.execute(text("PRAGMA user_version")).scalar_one()
+
+
+def run_migrations(engine):
+    """
+    Apply pending migrations in order, one transaction each; returns the resulting version
+
+    Each migration runs in a BEGIN IMMEDIATE transaction, which takes the
+    database's write lock before user_version is read again. Workers that
+    start together therefore apply each migration once: the others wait for
+    the lock (busy_timeout), see the new version and skip it.
+    """
+    with engine.connect() as conn:
+        # Transactions are issued by hand below, so the driver must not start its own
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        version = get_schema_version(conn)
+        for target, description, migrate in MIGRATIONS:
+            if target <= version:
+                continue
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                version = get_schema_version(conn)
+                if target > version:
+                    migrate(conn)
+                    conn.execute(text(f"PRAGMA user_version = {target}"))
+                conn.exec_driver_sql("COMMIT")
+            except BaseException:
+                conn.exec_driver_sql("ROLLBACK")
+                raise
+            if target > version:
+                logger.info("Applied migration %d: %s", target, description)
+                version = target
+    return version
@@ -1,20 +1,58 @@
 # models.py - Updated version with SQLAlchemy models
 
+import os
 from pydantic import BaseModel
 from typing import Optional, List
-from pydantic import Field
+from pydantic import Field, field_validator
 from enum import Enum
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum as SQLAEnum, create_engine
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Index, LargeBinary, Enum as SQLAEnum, create_engine, event, table, column
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import relationship, sessionmaker
+from metrics import instrument_engine
 
 # SQLAlchemy setup
-DATABASE_URL = "sqlite:///./autoforms.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./autoforms.db")
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# SQLite storage profile, applied to every new connection. journal_mode=WAL lets
+# readers run alongside the single writer; synchronous=NORMAL is durable in WAL
+# mode except across power loss; cache_size is in KiB when negative.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -64000)),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "temp_store": "MEMORY",
+}
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+# Async engine over the same database, used by the API routes so queries
+# and commits don't block the event loop
+ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if DATABASE_URL.startswith("sqlite"):
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+# Question options are stored joined by the ASCII unit separator (see OptionList)
+OPTION_SEPARATOR = "\x1f"
+
 # Pydantic models
 class QuizStatus(str, Enum):
     DRAFT = "draft"
@@ -26,6 +64,13 @@ class Question(BaseModel):
     options: List[str]
     correct_answer_index: int
 
+    @field_validator("options")
+    @classmethod
+    def options_storable(cls, options):
+        if any(OPTION_SEPARATOR in option for option in options):
+            raise ValueError("options may not contain the \\x1f control character")
+        return options
+
 class QuizCreate(BaseModel):
     title: str
     description: Optional[str] = None
@@ -41,9 +86,67 @@ class QuizResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class QuizDetailResponse(QuizResponse):
+    questions: List[Question]
+
 class EmailRecipients(BaseModel):
     recipients: List[str] = Field(..., description="List of email addresses to send the quiz to")
 
+class DeliveryStatus(str, Enum):
+    QUEUED = "queued"
+    SENT = "sent"
+    FAILED = "failed"
+    # Gmail did not answer in time; the message may have been sent, so it is not resent
+    UNKNOWN = "unknown"
+
+class EmailDeliveryResponse(BaseModel):
+    recipient: str
+    status: DeliveryStatus
+    attempts: int
+    last_error: Optional[str] = None
+    sent_at: Optional[datetime] = None
+    updated_at: datetime
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    status: JobStatus
+    quiz_id: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int
+    created_at: datetime
+    updated_at: datetime
+
+# Column types
+class OptionList(TypeDecorator):
+    """
+    A list of option strings stored as one unit-separator-joined TEXT value
+
+    Smaller than a JSON array and decoded with a single str.split, with no
+    per-row JSON parsing. Options may not contain the separator; an empty
+    list is stored as an empty string.
+    """
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if any(OPTION_SEPARATOR in option for option in value):
+            raise ValueError("Question options may not contain the \\x1f control character")
+        return OPTION_SEPARATOR.join(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return value.split(OPTION_SEPARATOR) if value else []
+
 # SQLAlchemy models
 class QuizDB(Base):
     __tablename__ = "quizzes"
@@ -59,24 +162,113 @@ class QuizDB(Base):
     
     questions = relationship("QuestionDB", back_populates="quiz", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Status-filtered and unfiltered list pages, newest first with (created_at, id) keyset cursors
+        Index("ix_quizzes_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_quizzes_created_at_id", "created_at", "id"),
+        # Collection version (max updated_at) and export's updated_since filter
+        Index("ix_quizzes_status_updated_at", "status", "updated_at"),
+    )
+
 class QuestionDB(Base):
     __tablename__ = "questions"
     
     id = Column(Integer, primary_key=True, index=True)
     quiz_id = Column(String, ForeignKey("quizzes.id"))
     text = Column(String, nullable=False)
-    options = Column(String, nullable=False)  # Stored as JSON string
+    options = Column(OptionList, nullable=False)
     correct_answer_index = Column(Integer, nullable=False)
     
     quiz = relationship("QuizDB", back_populates="questions")
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+    __table_args__ = (
+        Index("ix_questions_quiz_id_id", "quiz_id", "id"),
+    )
+
+class JobDB(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(String, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # "from_text" or "from_file"
+    status = Column(SQLAEnum(JobStatus), default=JobStatus.PENDING, index=True)
+    content = Column(Text, nullable=False)
+    suggested_title = Column(String, nullable=True)
+    no_cache = Column(Boolean, default=False, nullable=False)
+    quiz_id = Column(String, ForeignKey("quizzes.id"), nullable=True)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    # Set while a worker runs the job; another worker may take it over once it has passed
+    lease_until = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+class EmailDeliveryDB(Base):
+    __tablename__ = "email_deliveries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    quiz_id = Column(String, ForeignKey("quizzes.id"), nullable=False, index=True)
+    recipient = Column(String, nullable=False)
+    status = Column(SQLAEnum(DeliveryStatus), default=DeliveryStatus.QUEUED, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(String, nullable=True)
+    # Set while a worker is sending; another worker may take a queued delivery over once it has passed
+    lease_until = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    sent_at = Column(DateTime, nullable=True)
+
+class ExtractionCacheDB(Base):
+    __tablename__ = "extraction_cache"
+    
+    key = Column(String, primary_key=True)  # sha256 of content, title, model and prompt version
+    model = Column(String, nullable=False)
+    prompt_version = Column(String, nullable=False)
+    quiz_json = Column(Text, nullable=False)  # QuizCreate as JSON
+    hits = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.now)
+    last_accessed_at = Column(DateTime, default=datetime.now, index=True)
+
+# FTS5 index over quizzes and their questions (rowid = quizzes.rowid). It is a
+# virtual table created and kept in step by triggers in migrations.py, so it is
+# not part of Base.metadata.
+quiz_search = table("quiz_search", column("rowid"), column("title"), column("description"), column("questions"))
+
+class IdempotencyKeyDB(Base):
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String, primary_key=True)  # Idempotency-Key header value
+    path = Column(String, primary_key=True)  # Keys are scoped to the endpoint
+    request_hash = Column(String, nullable=False)  # sha256 of the query string and body
+    status_code = Column(Integer, nullable=True)
+    response_headers = Column(Text, nullable=True)  # [[name, value], ...] as JSON
+    response_body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    completed_at = Column(DateTime, nullable=True)  # NULL while the first request is running
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+# Backing tables for the simulated upstreams (UPSTREAM_PROVIDER=simulated)
+class SimulatedFormDB(Base):
+    __tablename__ = "simulated_forms"
+    
+    form_id = Column(String, primary_key=True)
+    form_json = Column(Text, nullable=False)  # Forms API form resource as JSON
+    revision_id = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+class EmailOutboxDB(Base):
+    __tablename__ = "email_outbox"
+    
+    id = Column(Integer, primary_key=True)
+    message_id = Column(String, nullable=False, unique=True)
+    recipient = Column(String, nullable=False, index=True)
+    subject = Column(String, nullable=True)
+    body = Column(Text, nullable=True)
+    sent_at = Column(DateTime, default=datetime.now)
+
+# Schema is created and upgraded by migrations.run_migrations() at startup
 
-# Helper function to get db session
-def get_db():
-    db = SessionLocal()
-    try:
+# Helper function to get an async db session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -0,0 +1,270 @@
+# resilience.py - Deadlines, retries and circuit breakers for the upstream APIs
+
+import asyncio
+import logging
+import os
+import random
+import ssl
+import sys
+import threading
+import time
+from fastapi import HTTPException
+from executors import forms_executor, gmail_executor, gemini_executor
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def upstream_cause(error: Exception) -> Exception:
+    """The upstream error behind an HTTPException raised `from` it, or the error itself"""
+    while isinstance(error, HTTPException) and error.__cause__ is not None:
+        error = error.__cause__
+    return error
+
+
+def _connection_errors():
+    """Transport failures: the request may not have reached the upstream, or its answer was lost"""
+    errors = [ConnectionError, TimeoutError, ssl.SSLError]
+    # Only checked once the client libraries are loaded, so this never imports them
+    httplib2 = sys.modules.get("httplib2")
+    if httplib2 is not None:
+        errors.append(httplib2.ServerNotFoundError)
+    httpx = sys.modules.get("httpx")
+    if httpx is not None:
+        errors.append(httpx.TransportError)
+    return tuple(errors)
+
+
+class UpstreamTimeout(HTTPException):
+    """The upstream did not answer in time; the call may or may not have taken effect"""
+
+    def __init__(self, name: str, timeout: float):
+        super().__init__(status_code=504, detail=f"{name} did not respond within {timeout:g}s")
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Rate limits, server errors, timeouts and connection failures: the upstream is struggling
+
+    Anything else (bad requests, bugs in our own code) says nothing about the
+    upstream's health, so it neither trips the breaker nor is retried.
+    """
+    error = upstream_cause(error)
+    if isinstance(error, UpstreamTimeout):
+        return True
+    if isinstance(error, HTTPException):
+        # Raised by this app (missing configuration, a full upstream queue), not by the upstream
+        return False
+    response = getattr(error, "resp", None)
+    if response is not None:
+        status = int(getattr(response, "status", 0))
+        return status == 429 or status >= 500
+    # google-genai API errors carry the HTTP status as `code`
+    status = getattr(error, "code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return isinstance(error, _connection_errors())
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Transient failures known not to have taken effect, so the call can be sent again
+
+    A timeout is transient but not retryable: the upstream may have carried
+    the call out after we stopped waiting (e.g. sent the email).
+    """
+    return is_transient(error) and not isinstance(upstream_cause(error), UpstreamTimeout)
+
+
+class CircuitOpenError(HTTPException):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=f"{name} is unavailable after repeated failures, try again later",
+            headers={"Retry-After": str(max(1, round(retry_after)))},
+        )
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast while an upstream keeps failing
+
+    After failure_threshold consecutive failures the breaker opens and calls
+    are rejected with CircuitOpenError. After reset_seconds one probe call is
+    let through (half-open): success closes the breaker, failure opens it
+    again for another reset_seconds.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go ahead now"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            retry_after = self.opened_at + self.reset_seconds - time.monotonic()
+            if self.state == OPEN and retry_after <= 0:
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(self.name, max(retry_after, 1))
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self._probing = False
+            if self.state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self.opened += 1
+                self._set_state(OPEN)
+
+    def release(self):
+        """End a call that neither succeeded nor failed upstream (e.g. a bad request)"""
+        with self._lock:
+            self._probing = False
+
+    def _set_state(self, state: str):
+        logger.warning("Circuit breaker %s: %s -> %s", self.name, self.state, state,
+                       extra={"consecutive_failures": self.consecutive_failures})
+        self.state = state
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "state_code": STATE_CODES[self.state],
+                "consecutive_failures": self.consecutive_failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+class Upstream:
+    """
+    Calls into one upstream through its executor, with a deadline, retries and a circuit breaker
+
+    Each attempt must finish within timeout seconds of a worker picking it
+    up or fails with 504; an attempt still queued after timeout seconds is
+    dropped with 503 and not counted against the upstream. Only calls marked
+    idempotent are retried, up to max_attempts, on transient errors, sleeping
+    a jittered exponential backoff (base_delay doubling, at most max_delay)
+    in between. A timed-out attempt keeps its worker thread until the
+    client's own socket timeout (GOOGLE_HTTP_TIMEOUT) ends it.
+    """
+
+    def __init__(self, name: str, executor, timeout: float, max_attempts: int,
+                 base_delay: float, max_delay: float, breaker: CircuitBreaker):
+        self.name = name
+        self.executor = executor
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker
+        self.retries = 0
+        self.timeouts = 0
+
+    async def call(self, fn, *args, idempotent: bool = False, **kwargs):
+        """Run fn(*args, **kwargs) on the upstream's executor; retried only when idempotent"""
+        attempts = self.max_attempts if idempotent else 1
+        for attempt in range(1, attempts + 1):
+            result, error = await self._attempt(fn, args, kwargs)
+            if error is None:
+                return result
+            # Idempotent calls are retried after timeouts too; others are never sent twice
+            if not is_transient(error) or attempt == attempts:
+                raise error
+            self.retries += 1
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+            logger.info("Retrying %s call in %.2fs after: %s", self.name, delay, error,
+                        extra={"attempt": attempt, "operation": getattr(fn, "__name__", "call")})
+            await asyncio.sleep(delay)
+
+    async def _attempt(self, fn, args, kwargs):
+        """One call through the breaker; returns (result, None) or (None, error)"""
+        self.breaker.allow()
+        recorded = False
+        try:
+            try:
+                result = await self.executor.run_with_timeout(self.timeout, fn, *args, **kwargs)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                error = UpstreamTimeout(self.name, self.timeout)
+            except Exception as e:
+                error = e
+            else:
+                self.breaker.record_success()
+                recorded = True
+                return result, None
+            if is_transient(error):
+                self.breaker.record_failure()
+                recorded = True
+            return None, error
+        finally:
+            # Cancelled, or failed without telling us anything about the upstream:
+            # counts neither way, but frees the half-open probe for the next call
+            if not recorded:
+                self.breaker.release()
+
+    def stats(self):
+        return {
+            **self.breaker.stats(),
+            "timeout_s": self.timeout,
+            "max_attempts": self.max_attempts,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+        }
+
+
+def _setting(name: str, setting: str, default):
+    return type(default)(os.getenv(f"{name.upper()}_{setting}", default))
+
+
+def _create_upstream(name: str, executor, timeout: float, max_attempts: int) -> Upstream:
+    return Upstream(
+        name,
+        executor,
+        timeout=_setting(name, "TIMEOUT", timeout),
+        max_attempts=_setting(name, "RETRY_ATTEMPTS", max_attempts),
+        base_delay=_setting(name, "RETRY_BASE_DELAY", 0.5),
+        max_delay=_setting(name, "RETRY_MAX_DELAY", 8.0),
+        breaker=CircuitBreaker(
+            name,
+            failure_threshold=_setting(name, "BREAKER_FAILURES", 5),
+            reset_seconds=_setting(name, "BREAKER_RESET_SECONDS", 30.0),
+        ),
+    )
+
+
+# Configured with e.g. FORMS_TIMEOUT, FORMS_RETRY_ATTEMPTS, FORMS_BREAKER_FAILURES
+forms_upstream = _create_upstream("forms", forms_executor, 30.0, 3)
+gmail_upstream = _create_upstream("gmail", gmail_executor, 20.0, 3)
+gemini_upstream = _create_upstream("gemini", gemini_executor, 120.0, 3)
+
+UPSTREAMS = [forms_upstream, gmail_upstream, gemini_upstream]
+
+
+def upstream_stats():
+    """Breaker state, retry and timeout counters for each upstream"""
+    return {upstream.name: upstream.stats() for upstream in UPSTREAMS}
@@ -1,22 +1,45 @@
+import logging
+import os
 from models import *
-from fastapi import FastAPI, HTTPException, Query, Body, Path, Depends
-from typing import List, Optional
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, HTTPException, Query, Body, Path, Depends, Header
+from typing import List, Optional, Union
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from starlette.responses import HTMLResponse
+from schema import QuizListResponse, QuizDetailListResponse, BulkQuizResponse, QuizSearchResponse
+from executors import executor_stats
+from resilience import forms_upstream, upstream_stats
+from email_fanout import email_fanout, get_quiz_deliveries
+from extraction_cache import extraction_cache
+from form_details_cache import form_details_cache
+from clients import client_registry
+from idempotency import idempotency_store
+from singleflight import singleflight_stats
+from metrics import registry, stats_collector
+
+logger = logging.getLogger(__name__)
 
 
 from helpers import (
     create_google_form, 
-    send_email_notification, 
-    get_db, 
-    get_quiz_by_id,
-    get_all_quizzes,
-    create_quiz_in_db,
-    update_quiz_status,
+    get_quiz_by_id_async,
+    get_quizzes_page_async,
+    search_quizzes_async,
+    create_quiz_in_db_async,
+    create_quizzes_bulk_async,
+    export_quizzes_ndjson,
+    etag_matches,
+    get_quiz_etag,
+    compute_etag,
+    get_quiz_collection_version_async,
+    QUIZ_CACHE_CONTROL,
+    update_quiz_status_async,
     convert_db_quiz_to_response,
+    parse_quiz_includes,
+    get_quiz_response_model,
     get_google_form_details
 )
 
@@ -27,34 +50,162 @@ router = APIRouter()
 def sayHello():
     return "welcome to autoquiz backend"
 
+@router.get("/stats")
+async def get_stats():
+    """
+    Upstream thread pool and cache stats
+    """
+    return {
+        "executors": executor_stats(),
+        "extraction_cache": extraction_cache.stats(),
+        "form_details_cache": form_details_cache.stats(),
+        "simulated_upstreams": client_registry.simulation_stats(),
+        "idempotency": idempotency_store.stats(),
+        "singleflight": singleflight_stats(),
+        "upstreams": upstream_stats(),
+    }
+
+registry.collector(stats_collector("upstream_pool", "upstream", executor_stats))
+registry.collector(stats_collector("cache", "cache", lambda: {
+    "extraction": extraction_cache.stats(),
+    "form_details": form_details_cache.stats(),
+}))
+registry.collector(stats_collector("simulated_upstream", "upstream", client_registry.simulation_stats))
+registry.collector(stats_collector("idempotency", "store", lambda: {"quiz_creation": idempotency_store.stats()}))
+registry.collector(stats_collector("singleflight", "group", singleflight_stats))
+# Circuit breaker state per upstream: upstream_breaker_state_code is 0 closed, 1 half-open, 2 open
+registry.collector(stats_collector("upstream_breaker", "upstream", upstream_stats))
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus metrics: per-route and per-upstream latency histograms, error counters and in-flight gauges
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Routes
 @router.post("/quizzes/", response_model=QuizResponse, status_code=201)
-async def create_quiz(quiz: QuizCreate = Body(...), db: Session = Depends(get_db)):
+async def create_quiz(quiz: QuizCreate = Body(...), db: AsyncSession = Depends(get_async_db)):
     """
     Create a new quiz in draft status
+
+    Send an Idempotency-Key header to make retries safe: a retry with the same
+    key returns the first response instead of creating another quiz.
     """
     # Create Google Form
     form_id, form_url = None, None
     try:
-        form_id, form_url = create_google_form(quiz.title, quiz.description, quiz.questions)
+        form_id, form_url = await forms_upstream.call(create_google_form, quiz.title, quiz.description, quiz.questions)
     except Exception as e:
         # Log the error but continue (we'll store the quiz without form data)
-        print(f"Error creating Google Form: {e}")
+        logger.warning("Error creating Google Form: %s", e)
     
     # Store quiz in database
-    db_quiz = create_quiz_in_db(db, quiz, form_id, form_url)
+    db_quiz = await create_quiz_in_db_async(db, quiz, form_id, form_url)
     
     # Convert to response model
-    response_data = convert_db_quiz_to_response(db_quiz)
-    return QuizResponse(**response_data)
+    return convert_db_quiz_to_response(db_quiz)
 
-@router.get("/quizzes/", response_model=List[QuizResponse])
-async def get_quizzes(status: Optional[QuizStatus] = Query(None), db: Session = Depends(get_db)):
+BULK_MAX_QUIZZES = int(os.getenv("BULK_MAX_QUIZZES", 5000))
+
+@router.post("/quizzes/bulk", response_model=BulkQuizResponse, status_code=201)
+async def create_quizzes_bulk(quizzes: List[QuizCreate] = Body(...), db: AsyncSession = Depends(get_async_db)):
     """
-    Get all quizzes, optionally filtered by status
+    Create many quizzes in draft status in one request
+
+    Each quiz gets its own entry in the results; invalid quizzes are reported
+    and skipped without affecting the rest.
     """
-    quizzes = get_all_quizzes(db, status)
-    return [QuizResponse(**convert_db_quiz_to_response(quiz)) for quiz in quizzes]
+    if not quizzes:
+        raise HTTPException(status_code=400, detail="No quizzes submitted")
+    if len(quizzes) > BULK_MAX_QUIZZES:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_QUIZZES} quizzes can be created per request")
+    
+    results = await create_quizzes_bulk_async(db, quizzes)
+    created = sum(1 for result in results if result["success"])
+    return {"results": results, "created": created, "failed": len(results) - created}
+
+def not_modified_response(etag: str):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": QUIZ_CACHE_CONTROL})
+
+def set_cache_headers(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = QUIZ_CACHE_CONTROL
+
+@router.get(
+    "/quizzes/",
+    response_model=Union[QuizDetailListResponse, QuizListResponse],
+    responses={304: {"description": "The client's cached copy (If-None-Match) is current"}}
+)
+async def get_quizzes(
+    status: Optional[QuizStatus] = Query(None),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of quizzes to return"),
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    include: Optional[str] = Query(None, description="Set to 'questions' to embed each quiz's questions"),
+    if_none_match: Optional[str] = Header(None),
+    response: Response = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get a page of quizzes, newest first, optionally filtered by status
+    """
+    includes = parse_quiz_includes(include)
+    
+    # The ETag only needs the collection version, so a match skips the page query entirely
+    version = await get_quiz_collection_version_async(db, status)
+    etag = compute_etag("quizzes", status, limit, cursor, ",".join(sorted(includes)), *version)
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag)
+    
+    response_model = get_quiz_response_model(includes)
+    quizzes, next_cursor, total = await get_quizzes_page_async(
+        db, status, limit, cursor, include_questions="questions" in includes
+    )
+    set_cache_headers(response, etag)
+    return {
+        "quizzes": [convert_db_quiz_to_response(quiz, response_model) for quiz in quizzes],
+        "total": total,
+        "next_cursor": next_cursor
+    }
+
+@router.get("/quizzes/export", response_class=StreamingResponse)
+async def export_quizzes(
+    status: Optional[QuizStatus] = Query(None, description="Only export quizzes with this status"),
+    updated_since: Optional[datetime] = Query(None, description="Only export quizzes updated at or after this time"),
+):
+    """
+    Stream every quiz with its questions as NDJSON (one JSON object per line)
+    """
+    return StreamingResponse(
+        export_quizzes_ndjson(status, updated_since),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="quizzes.ndjson"'}
+    )
+
+@router.get("/quizzes/search", response_model=QuizSearchResponse)
+async def search_quizzes(
+    q: str = Query(..., min_length=1, max_length=256, description="Words to find in titles, descriptions, questions and options"),
+    status: Optional[QuizStatus] = Query(None),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of results to return"),
+    offset: int = Query(0, ge=0, le=10000, description="Results to skip; next_offset of the previous page"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Full-text search over quizzes and their questions, most relevant first
+
+    Every word must match (the last one also as a prefix). Results are ranked
+    by bm25 with title matches weighted highest, and each carries a snippet
+    of the best matching field.
+    """
+    hits, next_offset, total = await search_quizzes_async(db, q, status, limit, offset)
+    return {
+        "results": [
+            {**convert_db_quiz_to_response(quiz), "score": score, "snippet": snippet}
+            for quiz, score, snippet in hits
+        ],
+        "total": total,
+        "next_offset": next_offset
+    }
 
 # This is a snippet to fix the approve_quiz route that was incorrectly named in the original code
 # The rest of the routes.py implementation remains the same as in the previous artifact
@@ -63,12 +214,15 @@ async def get_quizzes(status: Optional[QuizStatus] = Query(None), db: Session =
 async def approve_quiz(
     quiz_id: str = Path(...),
     email_data: EmailRecipients = Body(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Approve a quiz and send email notifications
+    Approve a quiz and queue email notifications
+
+    One invitation per recipient is queued and sent in the background;
+    delivery progress is available from /quizzes/{quiz_id}/deliveries.
     """
-    quiz = get_quiz_by_id(db, quiz_id)
+    quiz = await get_quiz_by_id_async(db, quiz_id)
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
     
@@ -80,51 +234,75 @@ async def approve_quiz(
     if not quiz.form_url:
         raise HTTPException(status_code=400, detail="Quiz does not have a valid Google Form URL")
     
-    email_sent = send_email_notification(
-        email_data.recipients,
-        quiz.title,
-        quiz.form_url
-    )
-    
-    if not email_sent:
-        raise HTTPException(status_code=500, detail="Failed to send email notifications")
+    # Queue deliveries and update quiz status in the same commit
+    deliveries = email_fanout.queue_deliveries(db, quiz_id, email_data.recipients)
+    if not deliveries:
+        raise HTTPException(status_code=400, detail="No email recipients given")
+    updated_quiz = await update_quiz_status_async(db, quiz_id, QuizStatus.APPROVED)
+    email_fanout.dispatch(deliveries, updated_quiz.title, updated_quiz.form_url)
     
-    # Update quiz status
-    updated_quiz = update_quiz_status(db, quiz_id, QuizStatus.APPROVED)
-    
-    return QuizResponse(**convert_db_quiz_to_response(updated_quiz))
+    return convert_db_quiz_to_response(updated_quiz)
 
-@router.get("/quizzes/{quiz_id}", response_model=QuizResponse)
-async def get_quiz(quiz_id: str = Path(...), db: Session = Depends(get_db)):
+@router.get("/quizzes/{quiz_id}/deliveries", response_model=List[EmailDeliveryResponse])
+async def get_deliveries(quiz_id: str = Path(...), db: AsyncSession = Depends(get_async_db)):
+    """
+    Get per-recipient email delivery status for a quiz
+    """
+    quiz = await get_quiz_by_id_async(db, quiz_id)
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    return await get_quiz_deliveries(db, quiz_id)
+
+@router.get(
+    "/quizzes/{quiz_id}",
+    response_model=Union[QuizDetailResponse, QuizResponse],
+    responses={304: {"description": "The client's cached copy (If-None-Match) is current"}}
+)
+async def get_quiz(
+    quiz_id: str = Path(...),
+    include: Optional[str] = Query(None, description="Set to 'questions' to embed the quiz's questions"),
+    if_none_match: Optional[str] = Header(None),
+    response: Response = None,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Get details for a specific quiz
     """
-    quiz = get_quiz_by_id(db, quiz_id)
+    includes = parse_quiz_includes(include)
+    quiz = await get_quiz_by_id_async(db, quiz_id)
     if not quiz or quiz.status == QuizStatus.DELETED:
         raise HTTPException(status_code=404, detail="Quiz not found")
     
-    return QuizResponse(**convert_db_quiz_to_response(quiz))
+    etag = get_quiz_etag(quiz, includes)
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag)
+    
+    # Questions are only loaded once we know the body is needed
+    if "questions" in includes:
+        await db.refresh(quiz, ["questions"])
+    set_cache_headers(response, etag)
+    return convert_db_quiz_to_response(quiz, get_quiz_response_model(includes))
 
 
 @router.delete("/quizzes/{quiz_id}", status_code=204)
-async def delete_quiz(quiz_id: str = Path(...), db: Session = Depends(get_db)):
+async def delete_quiz(quiz_id: str = Path(...), db: AsyncSession = Depends(get_async_db)):
     """
     Mark a quiz as deleted
     """
-    quiz = get_quiz_by_id(db, quiz_id)
+    quiz = await get_quiz_by_id_async(db, quiz_id)
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
     
-    updated_quiz = update_quiz_status(db, quiz_id, QuizStatus.DELETED)
-
-    return QuizResponse(**convert_db_quiz_to_response(updated_quiz))
+    await update_quiz_status_async(db, quiz_id, QuizStatus.DELETED)
 @router.get("/quizdetails/{form_id}", response_model=List[Question])
 async def get_form_details(form_id: str = Path(...)):
     """
     Get individual questions, options, and answers from a Google Form by its ID
+
+    Concurrent requests for the same form share one Forms API call.
     """
     try:
-        questions = get_google_form_details(form_id)
+        questions = await get_google_form_details(form_id)
         
         # Convert to Pydantic models
         pydantic_questions = []
@@ -136,83 +314,149 @@ async def get_form_details(form_id: str = Path(...)):
             pydantic_questions.append(Question(**q))
         
         return pydantic_questions
+    except HTTPException:
+        # 504 on a Forms timeout, 503 while the Forms circuit breaker is open and the form isn't cached
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Add this to routes.py
 
 from fastapi import UploadFile, File, Form
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 from typing import Optional
-from helpers import parse_quiz_with_gemini
+from helpers import run_quiz_creation_pipeline, check_extraction_length
+from jobs import enqueue_quiz_job, get_job_by_id
 
 class QuizTextInput(BaseModel):
     text: str
     suggested_title: Optional[str] = None
+    no_cache: bool = False
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 5 * 1024 * 1024))
+UPLOAD_READ_SIZE = 64 * 1024
+
+async def read_upload_text(file: UploadFile):
+    """Read an uploaded text file in fixed-size pieces, rejecting files over MAX_UPLOAD_BYTES"""
+    parts = []
+    size = 0
+    while True:
+        part = await file.read(UPLOAD_READ_SIZE)
+        if not part:
+            break
+        size += len(part)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"File is larger than {MAX_UPLOAD_BYTES} bytes")
+        parts.append(part)
+    try:
+        return b"".join(parts).decode('utf-8')
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File is not valid UTF-8 text")
+
+def set_extraction_headers(response: Response, stats):
+    """Report how the extraction was split up and how long it took"""
+    response.headers["X-Extraction-Chunks"] = str(stats.chunks)
+    response.headers["X-Extraction-Chunk-Latencies-Ms"] = ",".join(str(ms) for ms in stats.chunk_latencies_ms)
+    response.headers["X-Extraction-Time-Ms"] = str(stats.wall_time_ms)
+
+def job_accepted_response(job):
+    """202 Accepted response pointing at the job status endpoint"""
+    return JSONResponse(
+        status_code=202,
+        content=jsonable_encoder(JobResponse.model_validate(job, from_attributes=True)),
+        headers={"Location": f"/jobs/{job.id}"}
+    )
 
-@router.post("/quizzes/from-file", response_model=QuizResponse, status_code=201)
+@router.post(
+    "/quizzes/from-file",
+    response_model=QuizResponse,
+    status_code=201,
+    responses={202: {"model": JobResponse, "description": "Job accepted (async mode)"}}
+)
 async def create_quiz_from_file(
     file: UploadFile = File(...),
     suggested_title: Optional[str] = Form(None),
-    db: Session = Depends(get_db)
+    no_cache: bool = Form(False),
+    async_mode: bool = Query(False, alias="async", description="Queue the quiz creation and return a job"),
+    response: Response = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new quiz by uploading a text file
     
     The file can be in any format - the Gemini API will extract quiz questions automatically.
+    With ?async=true the request returns 202 and a job to poll at /jobs/{job_id}.
+    Retries with the same Idempotency-Key header return the first response.
     """
     if not file.filename.endswith(('.txt', '.md')):
         raise HTTPException(status_code=400, detail="Only text files (.txt, .md) are supported")
     
     # Read file content
-    content = await file.read()
-    file_content = content.decode('utf-8')
+    file_content = await read_upload_text(file)
     
-    # Parse quiz from content using Gemini
-    quiz_data = await parse_quiz_with_gemini(file_content, suggested_title)
+    if async_mode:
+        check_extraction_length(file_content)
+        job = await enqueue_quiz_job(db, "from_file", file_content, suggested_title, no_cache)
+        return job_accepted_response(job)
     
-    # Create Google Form
-    form_id, form_url = None, None
-    try:
-        form_id, form_url = create_google_form(quiz_data.title, quiz_data.description, quiz_data.questions)
-    except Exception as e:
-        # Log the error but continue (we'll store the quiz without form data)
-        print(f"Error creating Google Form: {e}")
+    # Parse quiz with Gemini and create the Google Form
+    quiz_data, form_id, form_url, extraction_stats = await run_quiz_creation_pipeline(
+        file_content, suggested_title, not no_cache
+    )
+    set_extraction_headers(response, extraction_stats)
     
     # Store quiz in database
-    db_quiz = create_quiz_in_db(db, quiz_data, form_id, form_url)
+    db_quiz = await create_quiz_in_db_async(db, quiz_data, form_id, form_url)
     
     # Convert to response model
-    response_data = convert_db_quiz_to_response(db_quiz)
-    return QuizResponse(**response_data)
+    return convert_db_quiz_to_response(db_quiz)
 
-@router.post("/quizzes/from-text", response_model=QuizResponse, status_code=200)
+@router.post(
+    "/quizzes/from-text",
+    response_model=QuizResponse,
+    status_code=200,
+    responses={202: {"model": JobResponse, "description": "Job accepted (async mode)"}}
+)
 async def create_quiz_from_text(
     quiz_text: QuizTextInput,
-    db: Session = Depends(get_db)
+    async_mode: bool = Query(False, alias="async", description="Queue the quiz creation and return a job"),
+    response: Response = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a quiz from text input
     
     The text can be structured or unstructured - the Gemini API will extract quiz questions automatically.
+    With ?async=true the request returns 202 and a job to poll at /jobs/{job_id}.
+    Retries with the same Idempotency-Key header return the first response.
     """
-    # Parse quiz from content using Gemini
-    quiz_data = await parse_quiz_with_gemini(quiz_text.text, quiz_text.suggested_title)
+    if async_mode:
+        check_extraction_length(quiz_text.text)
+        job = await enqueue_quiz_job(db, "from_text", quiz_text.text, quiz_text.suggested_title, quiz_text.no_cache)
+        return job_accepted_response(job)
     
-    # Create Google Form
-    form_id, form_url = None, None
-    try:
-        form_id, form_url = create_google_form(quiz_data.title, quiz_data.description, quiz_data.questions)
-    except Exception as e:
-        # Log the error but continue (we'll store the quiz without form data)
-        print(f"Error creating Google Form: {e}")
+    # Parse quiz with Gemini and create the Google Form
+    quiz_data, form_id, form_url, extraction_stats = await run_quiz_creation_pipeline(
+        quiz_text.text, quiz_text.suggested_title, not quiz_text.no_cache
+    )
+    set_extraction_headers(response, extraction_stats)
     
     # Store quiz in database
-    db_quiz = create_quiz_in_db(db, quiz_data, form_id, form_url)
+    db_quiz = await create_quiz_in_db_async(db, quiz_data, form_id, form_url)
     
     # Convert to response model
-    response_data = convert_db_quiz_to_response(db_quiz)
-    return QuizResponse(**response_data)
+    return convert_db_quiz_to_response(db_quiz)
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str = Path(...), db: AsyncSession = Depends(get_async_db)):
+    """
+    Get the status of a quiz-creation job
+    """
+    job = await get_job_by_id(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 def custom_openapi(app):
     """
     Generate a custom OpenAPI schema with all model definitions properly exposed
@@ -4,7 +4,7 @@ from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from enum import Enum
 from datetime import datetime
-from models import QuizStatus, Question, QuizCreate, QuizResponse, EmailRecipients
+from models import QuizStatus, Question, QuizCreate, QuizResponse, QuizDetailResponse, EmailRecipients, DeliveryStatus, EmailDeliveryResponse, JobStatus, JobResponse
 
 # Re-export all models to ensure they're included in the OpenAPI schema
 __all__ = [
@@ -12,10 +12,20 @@ __all__ = [
     "Question",
     "QuizCreate",
     "QuizResponse",
+    "QuizDetailResponse",
     "EmailRecipients",
+    "DeliveryStatus",
+    "EmailDeliveryResponse",
+    "JobStatus",
+    "JobResponse",
     "OpenAPISchema",
     "QuizTextInput",
     "QuizListResponse",
+    "QuizDetailListResponse",
+    "BulkQuizItemResult",
+    "BulkQuizResponse",
+    "QuizSearchHit",
+    "QuizSearchResponse",
     "ErrorResponse"
 ]
 
@@ -24,6 +34,7 @@ class QuizTextInput(BaseModel):
     """Input model for creating a quiz from text"""
     text: str = Field(..., description="The text content to parse into a quiz")
     suggested_title: Optional[str] = Field(None, description="Optional suggested title if none is found in the text")
+    no_cache: bool = Field(False, description="Skip the extraction cache and always call Gemini")
     
     class Config:
         schema_extra = {
@@ -37,6 +48,7 @@ class QuizListResponse(BaseModel):
     """Response model for listing quizzes"""
     quizzes: List[QuizResponse] = Field(..., description="List of quizzes")
     total: int = Field(..., description="Total number of quizzes")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, null on the last page")
     
     class Config:
         schema_extra = {
@@ -53,10 +65,44 @@ class QuizListResponse(BaseModel):
                         "updated_at": "2023-01-01T12:00:00"
                     }
                 ],
-                "total": 1
+                "total": 1,
+                "next_cursor": None
             }
         }
 
+class QuizDetailListResponse(BaseModel):
+    """Response model for listing quizzes with their questions embedded"""
+    quizzes: List[QuizDetailResponse] = Field(..., description="List of quizzes including questions")
+    total: int = Field(..., description="Total number of quizzes")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, null on the last page")
+
+class BulkQuizItemResult(BaseModel):
+    """Outcome of one quiz in a bulk create request"""
+    index: int = Field(..., description="Position of the quiz in the request body")
+    success: bool = Field(..., description="Whether the quiz was stored")
+    quiz_id: Optional[str] = Field(None, description="ID of the stored quiz")
+    form_id: Optional[str] = Field(None, description="Google Form ID, if the form was created")
+    form_url: Optional[str] = Field(None, description="Google Form URL, if the form was created")
+    error: Optional[str] = Field(None, description="Why the quiz was rejected")
+    form_error: Optional[str] = Field(None, description="Why the Google Form could not be created")
+
+class BulkQuizResponse(BaseModel):
+    """Response model for bulk quiz creation"""
+    results: List[BulkQuizItemResult] = Field(..., description="One result per submitted quiz, in request order")
+    created: int = Field(..., description="Number of quizzes stored")
+    failed: int = Field(..., description="Number of quizzes rejected")
+
+class QuizSearchHit(QuizResponse):
+    """A quiz matching a search, with its relevance and a highlighted excerpt"""
+    score: float = Field(..., description="bm25 relevance, higher is better")
+    snippet: str = Field(..., description="Best matching excerpt with matches wrapped in <mark></mark>")
+
+class QuizSearchResponse(BaseModel):
+    """Response model for quiz search"""
+    results: List[QuizSearchHit] = Field(..., description="Matching quizzes, most relevant first")
+    total: int = Field(..., description="Total number of matching quizzes")
+    next_offset: Optional[int] = Field(None, description="Offset of the next page, null on the last page")
+
 class ErrorResponse(BaseModel):
     """Error response model"""
     detail: str = Field(..., description="Error message")
@@ -0,0 +1,426 @@
+# simulation.py - Offline stand-ins for Google Forms, Gmail and Gemini
+
+import base64
+import json
+import os
+import random
+import re
+import threading
+import time
+import types
+import uuid
+from collections import deque
+from datetime import datetime
+from email import message_from_bytes
+from email.header import decode_header, make_header
+import httplib2
+from googleapiclient.errors import HttpError
+from models import SessionLocal, SimulatedFormDB, EmailOutboxDB
+
+
+class SimulatedUpstream:
+    """
+    Latency, quota and failure behaviour of one simulated upstream
+
+    Every call blocks the calling thread for a jittered latency, the way the
+    real blocking clients do. Calls beyond quota_per_minute in a sliding
+    60 second window fail with 429, and error_rate of the remaining calls
+    fail with 503; both are raised as googleapiclient HttpErrors. A seed
+    makes latencies and failures repeatable between runs.
+    """
+
+    def __init__(self, name: str, latency_ms: float, jitter: float = 0.25,
+                 quota_per_minute: int = 0, error_rate: float = 0.0, seed=None):
+        self.name = name
+        self.latency = latency_ms / 1000
+        self.jitter = jitter
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self._calls = deque()
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.total_calls = 0
+        self.throttled = 0
+        self.failed = 0
+
+    def _admit(self, cost: int):
+        """Charge cost calls against the quota; returns the HTTP status to fail with, if any"""
+        with self._lock:
+            self.total_calls += cost
+            now = time.monotonic()
+            if self.quota_per_minute:
+                while self._calls and self._calls[0] <= now - 60:
+                    self._calls.popleft()
+                if len(self._calls) + cost > self.quota_per_minute:
+                    self.throttled += cost
+                    return 429
+                self._calls.extend([now] * cost)
+            if self._random.random() < self.error_rate:
+                self.failed += cost
+                return 503
+            return None
+
+    def call(self, handler, cost: int = 1):
+        """Wait out the simulated latency, then run handler unless the call is throttled or fails"""
+        status = self._admit(cost)
+        time.sleep(max(0.0, self._random.gauss(self.latency, self.latency * self.jitter)))
+        if status is not None:
+            reason = "rateLimitExceeded" if status == 429 else "backendError"
+            content = json.dumps({"error": {"code": status, "message": f"Simulated {self.name} {reason}"}})
+            raise HttpError(httplib2.Response({"status": status}), content.encode("utf-8"))
+        return handler()
+
+    def stats(self):
+        return {
+            "calls": self.total_calls,
+            "throttled": self.throttled,
+            "failed": self.failed,
+        }
+
+
+def _not_found(form_id: str):
+    content = json.dumps({"error": {"code": 404, "message": f"Requested entity was not found: {form_id}"}})
+    return HttpError(httplib2.Response({"status": 404}), content.encode("utf-8"))
+
+
+# Form stores
+
+class MemoryFormStore:
+    """Simulated forms kept in process memory (lost on restart)"""
+
+    def __init__(self):
+        self._forms = {}
+        self._lock = threading.Lock()
+
+    def create(self, form):
+        with self._lock:
+            self._forms[form["formId"]] = json.dumps(form)
+
+    def get(self, form_id: str):
+        with self._lock:
+            form_json = self._forms.get(form_id)
+        return json.loads(form_json) if form_json else None
+
+    def update(self, form_id: str, apply):
+        """Apply a change to a stored form under the store lock; returns the updated form"""
+        with self._lock:
+            if form_id not in self._forms:
+                raise _not_found(form_id)
+            form = apply(json.loads(self._forms[form_id]))
+            self._forms[form_id] = json.dumps(form)
+            return form
+
+
+class SqliteFormStore:
+    """Simulated forms kept in the simulated_forms table"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def create(self, form):
+        with SessionLocal() as db:
+            db.add(SimulatedFormDB(form_id=form["formId"], form_json=json.dumps(form), revision_id=form["revisionId"]))
+            db.commit()
+
+    def get(self, form_id: str):
+        with SessionLocal() as db:
+            row = db.get(SimulatedFormDB, form_id)
+            return json.loads(row.form_json) if row else None
+
+    def update(self, form_id: str, apply):
+        # SQLite has a single writer anyway; the lock avoids lost updates between threads
+        with self._lock, SessionLocal() as db:
+            row = db.get(SimulatedFormDB, form_id)
+            if row is None:
+                raise _not_found(form_id)
+            form = apply(json.loads(row.form_json))
+            row.form_json = json.dumps(form)
+            row.revision_id = form["revisionId"]
+            db.commit()
+            return form
+
+
+# Google Forms
+
+class _SimulatedRequest:
+    """Mirrors googleapiclient's HttpRequest: nothing happens until execute()"""
+
+    def __init__(self, upstream, handler):
+        self._upstream = upstream
+        self._handler = handler
+
+    def execute(self, num_retries=0):
+        return self._upstream.call(self._handler)
+
+
+class _SimulatedBatch:
+    """Mirrors BatchHttpRequest: one round trip, each request charged against quota"""
+
+    def __init__(self, upstream, callback):
+        self._upstream = upstream
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, request_id=None, callback=None):
+        self._requests.append((request_id or str(len(self._requests)), request, callback or self._callback))
+
+    def execute(self):
+        def run_all():
+            for request_id, request, callback in self._requests:
+                try:
+                    response, exception = request._handler(), None
+                except HttpError as e:
+                    response, exception = None, e
+                callback(request_id, response, exception)
+
+        self._upstream.call(run_all, cost=len(self._requests))
+
+
+class SimulatedFormsService:
+    """The subset of the Forms v1 API used by helpers.py"""
+
+    def __init__(self, upstream: SimulatedUpstream, store):
+        self.upstream = upstream
+        self.store = store
+
+    def forms(self):
+        return self
+
+    def new_batch_http_request(self, callback=None):
+        return _SimulatedBatch(self.upstream, callback)
+
+    def create(self, body):
+        def handler():
+            form_id = f"sim-{uuid.uuid4().hex}"
+            info = dict(body.get("info", {}))
+            info.setdefault("documentTitle", info.get("title", "Untitled form"))
+            form = {
+                "formId": form_id,
+                "info": info,
+                "items": [],
+                "revisionId": "00000001",
+                "responderUri": f"https://docs.google.com/forms/d/e/{form_id}/viewform",
+            }
+            self.store.create(form)
+            return form
+        return _SimulatedRequest(self.upstream, handler)
+
+    def batchUpdate(self, formId, body):
+        def apply(form):
+            for request in body.get("requests", []):
+                if "createItem" in request:
+                    item = json.loads(json.dumps(request["createItem"]["item"]))
+                    item.setdefault("itemId", uuid.uuid4().hex[:8])
+                    question = item.get("questionItem", {}).get("question")
+                    if question is not None:
+                        question.setdefault("questionId", uuid.uuid4().hex[:8])
+                    index = request["createItem"].get("location", {}).get("index", len(form["items"]))
+                    form["items"].insert(index, item)
+                elif "updateSettings" in request:
+                    form["settings"] = request["updateSettings"]["settings"]
+                elif "updateFormInfo" in request:
+                    form["info"].update(request["updateFormInfo"]["info"])
+            form["revisionId"] = f"{int(form['revisionId']) + 1:08d}"
+            return form
+
+        def handler():
+            form = self.store.update(formId, apply)
+            return {"form": form, "replies": [{} for _ in body.get("requests", [])],
+                    "writeControl": {"requiredRevisionId": form["revisionId"]}}
+        return _SimulatedRequest(self.upstream, handler)
+
+    def get(self, formId, fields=None):
+        def handler():
+            form = self.store.get(formId)
+            if form is None:
+                raise _not_found(formId)
+            if fields:
+                # Only top-level field masks are supported
+                return {key: form[key] for key in fields.split(",") if key in form}
+            return form
+        return _SimulatedRequest(self.upstream, handler)
+
+
+# Gmail
+
+class SimulatedGmailService:
+    """users().messages().send() that writes each message to the email_outbox table"""
+
+    def __init__(self, upstream: SimulatedUpstream):
+        self.upstream = upstream
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def send(self, userId, body):
+        def handler():
+            message = message_from_bytes(base64.urlsafe_b64decode(body["raw"]))
+            subject = str(make_header(decode_header(message.get("Subject", ""))))
+            text = next(
+                (part.get_payload(decode=True).decode("utf-8", "replace")
+                 for part in message.walk() if part.get_content_type() == "text/plain"),
+                None
+            )
+            message_id = uuid.uuid4().hex
+            recipients = [r.strip() for r in message.get("To", "").split(",") if r.strip()]
+            with SessionLocal() as db:
+                db.add_all([
+                    EmailOutboxDB(message_id=f"{message_id}-{n}", recipient=recipient, subject=subject,
+                                  body=text, sent_at=datetime.now())
+                    for n, recipient in enumerate(recipients)
+                ])
+                db.commit()
+            return {"id": message_id, "threadId": message_id, "labelIds": ["SENT"]}
+        return _SimulatedRequest(self.upstream, handler)
+
+
+# Gemini
+
+QUESTION_LINE = re.compile(r"^\s*(?:Q(?:uestion)?\s*)?\d+\s*[.):]\s*(.+)$", re.IGNORECASE)
+OPTION_LINE = re.compile(r"^\s*[(\[]?([A-Ha-h])\s*[.)\]:]\s+(.+)$")
+INLINE_OPTION = re.compile(r"(?:^|\s)[(\[]?([A-H])[)\]]\s+")
+ANSWER_LINE = re.compile(r"^\s*(?:correct\s+)?answer\s*[:\-]\s*(.+)$", re.IGNORECASE)
+CORRECT_MARKERS = re.compile(r"\s*(?:\*|\(correct\)|✓|✔)\s*$", re.IGNORECASE)
+
+
+def _split_inline_options(line: str):
+    """Split 'Question? A) one B) two' into the question text and its options"""
+    matches = list(INLINE_OPTION.finditer(line))
+    if len(matches) < 2:
+        return line, []
+    options = [
+        line[match.end():(matches[i + 1].start() if i + 1 < len(matches) else len(line))].strip()
+        for i, match in enumerate(matches)
+    ]
+    return line[:matches[0].start()].strip(), options
+
+
+def _resolve_answer(answer: str, options):
+    answer = answer.strip().rstrip(".")
+    if len(answer) == 1 and answer.upper() in "ABCDEFGH":
+        index = ord(answer.upper()) - ord("A")
+        return index if index < len(options) else None
+    for index, option in enumerate(options):
+        if option.lower() == answer.lower():
+            return index
+    return None
+
+
+def extract_quiz_by_rules(content: str, suggested_title: str = None):
+    """
+    Deterministic quiz extraction from numbered questions with lettered options
+
+    Options may be on their own lines ("A) ...") or inline after the
+    question. The correct option is the one marked with "*", "(correct)" or
+    a check mark, or named by a following "Answer: B" line; otherwise the
+    first option. Questions with fewer than two options are skipped.
+    """
+    lines = [line.rstrip() for line in content.splitlines()]
+    title = suggested_title
+    first = next((line.strip() for line in lines if line.strip()), "")
+    if first.startswith("#"):
+        title = first.lstrip("#").strip()
+    elif first and not QUESTION_LINE.match(first) and len(first) <= 120:
+        title = title or first
+
+    questions = []
+    current = None
+
+    def finish():
+        if current and len(current["options"]) >= 2:
+            index = current["correct_answer_index"]
+            current["correct_answer_index"] = index if index is not None else 0
+            questions.append(current)
+
+    for line in lines:
+        question_match = QUESTION_LINE.match(line)
+        option_match = OPTION_LINE.match(line)
+        answer_match = ANSWER_LINE.match(line)
+        if answer_match and current:
+            index = _resolve_answer(answer_match.group(1), current["options"])
+            if index is not None:
+                current["correct_answer_index"] = index
+        elif option_match and current:
+            option = option_match.group(2).strip()
+            if CORRECT_MARKERS.search(option):
+                option = CORRECT_MARKERS.sub("", option)
+                current["correct_answer_index"] = len(current["options"])
+            current["options"].append(option)
+        elif question_match:
+            finish()
+            text, inline_options = _split_inline_options(question_match.group(1).strip())
+            current = {"text": text, "options": [], "correct_answer_index": None}
+            for option in inline_options:
+                if CORRECT_MARKERS.search(option):
+                    option = CORRECT_MARKERS.sub("", option)
+                    current["correct_answer_index"] = len(current["options"])
+                current["options"].append(option)
+    finish()
+
+    return {
+        "title": title or "Untitled quiz",
+        "description": f"{len(questions)} questions extracted by the simulated model",
+        "questions": questions,
+    }
+
+
+class _SimulatedModels:
+    PROMPT_CONTENT = re.compile(r"Text to extract quiz from:\s*\n?(.*)$", re.DOTALL)
+    PROMPT_TITLE = re.compile(r"Use '(.*?)' as the quiz title")
+
+    def __init__(self, upstream: SimulatedUpstream):
+        self.upstream = upstream
+
+    def generate_content(self, model, contents, config=None):
+        def handler():
+            content_match = self.PROMPT_CONTENT.search(contents)
+            title_match = self.PROMPT_TITLE.search(contents)
+            quiz = extract_quiz_by_rules(
+                content_match.group(1) if content_match else contents,
+                title_match.group(1) if title_match else None
+            )
+            return types.SimpleNamespace(text=json.dumps(quiz))
+        return self.upstream.call(handler)
+
+
+class SimulatedGenaiClient:
+    """A genai.Client whose models.generate_content runs extract_quiz_by_rules"""
+
+    def __init__(self, upstream: SimulatedUpstream):
+        self.models = _SimulatedModels(upstream)
+
+
+def _upstream_from_env(name: str, default_latency_ms: float):
+    prefix = f"SIMULATED_{name.upper()}"
+    return SimulatedUpstream(
+        name,
+        latency_ms=float(os.getenv(f"{prefix}_LATENCY_MS", default_latency_ms)),
+        jitter=float(os.getenv("SIMULATED_LATENCY_JITTER", 0.25)),
+        quota_per_minute=int(os.getenv(f"{prefix}_QUOTA_PER_MINUTE", 0)),
+        error_rate=float(os.getenv(f"{prefix}_ERROR_RATE", 0.0)),
+    )
+
+
+def build_simulated_clients(store=None, upstreams=None):
+    """
+    Simulated forms, gmail and genai clients; returns (clients, upstreams)
+
+    The form store and the upstreams default to the ones configured by the
+    SIMULATED_* environment variables.
+    """
+    if store is None:
+        store = SqliteFormStore() if os.getenv("SIMULATED_FORMS_STORE", "memory") == "sqlite" else MemoryFormStore()
+    if upstreams is None:
+        upstreams = {
+            "forms": _upstream_from_env("forms", 150),
+            "gmail": _upstream_from_env("gmail", 100),
+            "genai": _upstream_from_env("gemini", 1500),
+        }
+    return {
+        "forms": SimulatedFormsService(upstreams["forms"], store),
+        "gmail": SimulatedGmailService(upstreams["gmail"]),
+        "genai": SimulatedGenaiClient(upstreams["genai"]),
+    }, upstreams
@@ -0,0 +1,66 @@
+# singleflight.py - Coalescing of identical concurrent upstream calls
+
+import asyncio
+import copy
+
+
+class SingleFlight:
+    """
+    Shares one in-flight call between concurrent callers asking for the same key
+
+    The first caller for a key starts the call; callers arriving before it
+    finishes wait for the same result (or exception) instead of starting
+    their own. Nothing is kept once the call finishes, so this coalesces
+    bursts without caching. The call runs as its own task, so a caller that
+    gives up (e.g. a client disconnect) does not cancel it for the others.
+    Every caller gets its own deep copy of the result, since callers may
+    modify it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def do(self, key, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs), or the identical call already running for key"""
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Also marks the exception as retrieved when every caller has gone
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self):
+        calls = self.leaders + self.coalesced
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / calls, 4) if calls else 0.0,
+            "errors": self.errors,
+        }
+
+
+# Concurrent /quizdetails requests for one form share a single forms().get
+form_details_flight = SingleFlight("form_details")
+# Identical extraction requests (same cache key) share a single Gemini call
+gemini_flight = SingleFlight("gemini_extraction")
+
+FLIGHTS = [form_details_flight, gemini_flight]
+
+
+def singleflight_stats():
+    return {flight.name: flight.stats() for flight in FLIGHTS}
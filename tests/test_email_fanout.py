@@ -0,0 +1,89 @@
+# test_email_fanout.py - Delivery leases and crash recovery in email_fanout.py
+
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='autoforms-test-'), 'test.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import AsyncSessionLocal, DeliveryStatus, EmailDeliveryDB, QuizDB, QuizStatus, async_engine, engine  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+import email_fanout  # noqa: E402
+
+run_migrations(engine)
+
+
+async def add_delivery(lease_until=None, attempts=0):
+    current_time = datetime.now()
+    quiz = QuizDB(id=str(uuid.uuid4()), title="Quiz", status=QuizStatus.APPROVED, form_url="https://forms.example/q",
+                  created_at=current_time, updated_at=current_time)
+    delivery = EmailDeliveryDB(quiz_id=quiz.id, recipient=f"{uuid.uuid4().hex}@example.com",
+                               status=DeliveryStatus.QUEUED, attempts=attempts, lease_until=lease_until,
+                               created_at=current_time, updated_at=current_time)
+    async with AsyncSessionLocal() as db:
+        db.add_all([quiz, delivery])
+        await db.commit()
+    return delivery.id, delivery.recipient
+
+
+async def get_delivery(delivery_id):
+    async with AsyncSessionLocal() as db:
+        return await db.get(EmailDeliveryDB, delivery_id)
+
+
+def run_fanout(monkeypatch, setup, seconds, queue_after_start=False):
+    """Run a fan-out with a fast sweep for `seconds`; returns (deliveries added, their rows, recipients sent to)"""
+    sent = []
+    monkeypatch.setattr(email_fanout, "send_quiz_invitation", lambda recipient, title, url: sent.append(recipient))
+    fanout = email_fanout.EmailFanout(concurrency=4, rate=100, burst=100, max_attempts=3, base_delay=0,
+                                      lease_seconds=30, sweep_seconds=0.1)
+
+    async def run():
+        added = [] if queue_after_start else await setup()
+        await fanout.start()
+        try:
+            if queue_after_start:
+                added = await setup()
+            await asyncio.sleep(seconds)
+        finally:
+            await fanout.stop()
+        rows = [await get_delivery(delivery_id) for delivery_id, _ in added]
+        await async_engine.dispose()
+        return added, rows
+
+    added, rows = asyncio.run(run())
+    return added, rows, sent
+
+
+def test_delivery_held_by_a_crashed_worker_is_not_sent_twice(monkeypatch):
+    async def setup():
+        # Leased by a worker that died after recording an attempt: it may have gone out
+        return [await add_delivery(lease_until=datetime.now() + timedelta(seconds=0.3), attempts=1)]
+
+    _, [delivery], sent = run_fanout(monkeypatch, setup, 0.6)
+    assert sent == []
+    assert delivery.status == DeliveryStatus.UNKNOWN
+    assert delivery.lease_until is None
+
+
+def test_delivery_abandoned_before_its_first_attempt_is_sent(monkeypatch):
+    async def setup():
+        return [await add_delivery(lease_until=datetime.now() + timedelta(seconds=0.3), attempts=0)]
+
+    [(_, recipient)], [delivery], sent = run_fanout(monkeypatch, setup, 0.6)
+    assert sent == [recipient]
+    assert delivery.status == DeliveryStatus.SENT
+    assert delivery.attempts == 1
+
+
+def test_delivery_queued_by_another_process_is_sent_once(monkeypatch):
+    async def setup():
+        return [await add_delivery()]
+
+    [(_, recipient)], [delivery], sent = run_fanout(monkeypatch, setup, 0.5, queue_after_start=True)
+    assert sent == [recipient]
+    assert delivery.status == DeliveryStatus.SENT
@@ -0,0 +1,157 @@
+# test_idempotency.py - Idempotency-Key handling in idempotency.py
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='autoforms-test-'), 'test.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import AsyncSessionLocal, IdempotencyKeyDB, async_engine, engine  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from idempotency import IdempotencyMiddleware, IdempotencyStore, request_fingerprint  # noqa: E402
+
+run_migrations(engine)
+
+PATH = "/things"
+BODY = json.dumps({"name": "quiz"}).encode()
+
+
+def make_app(statuses=(), delay=0.0):
+    """An app whose POST /things counts its calls; statuses are returned in turn, then 201"""
+    app = FastAPI()
+    app.state.calls = 0
+    pending = list(statuses)
+
+    @app.post(PATH)
+    async def create(request: Request):
+        app.state.calls += 1
+        body = await request.json()
+        await asyncio.sleep(delay)
+        status = pending.pop(0) if pending else 201
+        return JSONResponse({"call": app.state.calls, **body}, status_code=status)
+
+    store = IdempotencyStore(ttl_seconds=3600, wait_timeout=5, lock_timeout=60, poll_interval=0.01)
+    app.add_middleware(IdempotencyMiddleware, paths=[PATH], max_body_bytes=1024, store=store)
+    return app
+
+
+def post(client, key, body=BODY):
+    return client.post(PATH, content=body, headers={"Idempotency-Key": key, "Content-Type": "application/json"})
+
+
+def run(app, requests):
+    """Run requests(client) against the app; returns its result"""
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await requests(client)
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(main())
+
+
+async def add_key(key, created_at, expires_at, completed=False):
+    row = IdempotencyKeyDB(key=key, path=PATH, request_hash=request_fingerprint(b"", "application/json", BODY),
+                           created_at=created_at, expires_at=expires_at)
+    if completed:
+        row.status_code = 201
+        row.response_headers = json.dumps([["content-type", "application/json"]])
+        row.response_body = b'{"call": 0}'
+        row.completed_at = created_at
+    async with AsyncSessionLocal() as db:
+        db.add(row)
+        await db.commit()
+
+
+def test_concurrent_retries_run_the_request_once():
+    app = make_app(delay=0.2)
+    key = str(uuid.uuid4())
+
+    async def requests(client):
+        return await asyncio.gather(*(post(client, key) for _ in range(5)))
+
+    responses = run(app, requests)
+    assert app.state.calls == 1
+    assert [response.status_code for response in responses] == [201] * 5
+    assert sum(response.headers.get("idempotent-replayed") == "true" for response in responses) == 4
+    assert len({response.content for response in responses}) == 1
+
+
+def test_key_reused_for_a_different_body_is_rejected():
+    app = make_app()
+    key = str(uuid.uuid4())
+
+    async def requests(client):
+        await post(client, key)
+        return await post(client, key, json.dumps({"name": "other"}).encode())
+
+    response = run(app, requests)
+    assert response.status_code == 422
+    assert app.state.calls == 1
+
+
+def test_oversized_body_is_rejected_before_the_app_runs():
+    app = make_app()
+
+    async def requests(client):
+        return await post(client, str(uuid.uuid4()), json.dumps({"name": "x" * 2048}).encode())
+
+    response = run(app, requests)
+    assert response.status_code == 413
+    assert app.state.calls == 0
+
+
+def test_key_is_released_after_a_server_error():
+    app = make_app(statuses=[503])
+    key = str(uuid.uuid4())
+
+    async def requests(client):
+        return await post(client, key), await post(client, key)
+
+    first, retry = run(app, requests)
+    assert first.status_code == 503
+    assert retry.status_code == 201
+    assert "idempotent-replayed" not in retry.headers
+    assert app.state.calls == 2
+
+
+def test_expired_key_is_taken_over():
+    app = make_app()
+    key = str(uuid.uuid4())
+
+    async def requests(client):
+        created_at = datetime.now() - timedelta(hours=2)
+        await add_key(key, created_at, expires_at=created_at + timedelta(hours=1), completed=True)
+        return await post(client, key)
+
+    response = run(app, requests)
+    assert response.status_code == 201
+    assert "idempotent-replayed" not in response.headers
+    assert app.state.calls == 1
+
+
+def test_key_abandoned_by_a_dead_request_is_taken_over():
+    app = make_app()
+    key = str(uuid.uuid4())
+
+    async def requests(client):
+        # Claimed, never completed, and older than lock_timeout
+        created_at = datetime.now() - timedelta(seconds=120)
+        await add_key(key, created_at, expires_at=created_at + timedelta(hours=1))
+        return await post(client, key)
+
+    response = run(app, requests)
+    assert response.status_code == 201
+    assert response.json()["call"] == 1
+    assert app.state.calls == 1
@@ -0,0 +1,107 @@
+# test_jobs.py - Job leases and crash recovery in jobs.py
+
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='autoforms-test-'), 'test.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import AsyncSessionLocal, JobDB, JobStatus, async_engine, engine  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from jobs import JobWorker  # noqa: E402
+
+run_migrations(engine)
+
+
+async def add_job(status, lease_until=None, attempts=0):
+    current_time = datetime.now()
+    job = JobDB(id=str(uuid.uuid4()), kind="from_text", status=status, content="text", attempts=attempts,
+                lease_until=lease_until, created_at=current_time, updated_at=current_time)
+    async with AsyncSessionLocal() as db:
+        db.add(job)
+        await db.commit()
+    return job.id
+
+
+async def get_job(job_id):
+    async with AsyncSessionLocal() as db:
+        return await db.get(JobDB, job_id)
+
+
+def make_worker(processed):
+    worker = JobWorker(concurrency=2, lease_seconds=30, sweep_seconds=0.1)
+
+    async def process(job_id):
+        processed.append(job_id)
+        async with AsyncSessionLocal() as db:
+            job = await db.get(JobDB, job_id)
+            job.status = JobStatus.SUCCEEDED
+            job.lease_until = None
+            await db.commit()
+
+    worker._process = process
+    return worker
+
+
+def test_job_of_a_crashed_worker_is_taken_over_once_its_lease_expires():
+    processed = []
+
+    async def run():
+        # Left RUNNING by a worker that died, with its lease still live
+        job_id = await add_job(JobStatus.RUNNING, lease_until=datetime.now() + timedelta(seconds=0.5), attempts=1)
+        worker = make_worker(processed)
+        await worker.start()
+        try:
+            await asyncio.sleep(0.2)
+            assert job_id not in processed
+            await asyncio.sleep(0.8)
+        finally:
+            await worker.stop()
+        job = await get_job(job_id)
+        await async_engine.dispose()
+        return job_id, job
+
+    job_id, job = asyncio.run(run())
+    assert processed == [job_id]
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.attempts == 2
+
+
+def test_job_queued_after_start_by_another_process_is_picked_up():
+    processed = []
+
+    async def run():
+        worker = make_worker(processed)
+        await worker.start()
+        try:
+            job_id = await add_job(JobStatus.PENDING)
+            await asyncio.sleep(0.5)
+        finally:
+            await worker.stop()
+        await async_engine.dispose()
+        return job_id
+
+    job_id = asyncio.run(run())
+    assert processed == [job_id]
+
+
+def test_job_is_run_once_by_two_workers():
+    processed = []
+
+    async def run():
+        job_id = await add_job(JobStatus.PENDING)
+        workers = [make_worker(processed), make_worker(processed)]
+        await asyncio.gather(*(worker.start() for worker in workers))
+        try:
+            await asyncio.sleep(0.5)
+        finally:
+            await asyncio.gather(*(worker.stop() for worker in workers))
+        await async_engine.dispose()
+        return job_id
+
+    job_id = asyncio.run(run())
+    assert processed == [job_id]
@@ -0,0 +1,81 @@
+# test_migrations.py - Upgrading a database from the original schema in migrations.py
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+from sqlalchemy import create_engine, inspect, select
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import QuestionDB  # noqa: E402
+from migrations import MIGRATIONS, _compact_question_options, get_schema_version, run_migrations  # noqa: E402
+
+# Options as the original schema stored them: JSON arrays
+OLD_OPTIONS = [
+    ["Paris", "London", "Berlin"],
+    ["[1, 2] is a list", "(1, 2) is a tuple"],
+    ["A [bracketed] word", "Café", "“Quoted”"],
+    ["Only one option"],
+]
+
+
+def make_old_database():
+    path = os.path.join(tempfile.mkdtemp(prefix="autoforms-test-"), "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE quizzes (id VARCHAR PRIMARY KEY, title VARCHAR NOT NULL, description VARCHAR,
+                              status VARCHAR(8), form_url VARCHAR, form_id VARCHAR,
+                              created_at DATETIME, updated_at DATETIME);
+        CREATE TABLE questions (id INTEGER PRIMARY KEY, quiz_id VARCHAR REFERENCES quizzes(id),
+                                text VARCHAR NOT NULL, options VARCHAR NOT NULL,
+                                correct_answer_index INTEGER NOT NULL);
+        INSERT INTO quizzes VALUES ('quiz-1', 'Old quiz', NULL, 'DRAFT', NULL, NULL,
+                                    '2025-01-01 00:00:00.000000', '2025-01-01 00:00:00.000000');
+    """)
+    conn.executemany(
+        "INSERT INTO questions (quiz_id, text, options, correct_answer_index) VALUES ('quiz-1', ?, ?, 0)",
+        [(f"Question {n}", json.dumps(options)) for n, options in enumerate(OLD_OPTIONS)]
+    )
+    conn.commit()
+    conn.close()
+    return create_engine(f"sqlite:///{path}")
+
+
+def stored_options(engine):
+    with engine.connect() as conn:
+        return [row.options for row in conn.exec_driver_sql("SELECT options FROM questions ORDER BY id")]
+
+
+def test_old_json_options_are_compacted():
+    engine = make_old_database()
+    assert run_migrations(engine) == MIGRATIONS[-1][0]
+    with Session(engine) as db:
+        decoded = db.scalars(select(QuestionDB.options).order_by(QuestionDB.id)).all()
+    assert decoded == OLD_OPTIONS
+
+
+def test_tables_new_in_this_schema_are_created_whole():
+    engine = make_old_database()
+    run_migrations(engine)
+    inspector = inspect(engine)
+    assert {"no_cache", "lease_until"} <= {column["name"] for column in inspector.get_columns("jobs")}
+    assert "lease_until" in {column["name"] for column in inspector.get_columns("email_deliveries")}
+    assert {"idempotency_keys", "simulated_forms", "email_outbox"} <= set(inspector.get_table_names())
+
+
+def test_compacting_twice_changes_nothing():
+    engine = make_old_database()
+    run_migrations(engine)
+    compacted = stored_options(engine)
+    with engine.begin() as conn:
+        _compact_question_options(conn)
+    assert stored_options(engine) == compacted
+    # Re-running the migrations is a no-op too
+    assert run_migrations(engine) == MIGRATIONS[-1][0]
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == MIGRATIONS[-1][0]
+    assert stored_options(engine) == compacted
@@ -0,0 +1,114 @@
+# test_resilience.py - Error classification and retries in resilience.py
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from executors import UpstreamExecutor  # noqa: E402
+from resilience import CircuitBreaker, HALF_OPEN, Upstream, UpstreamTimeout, is_retryable, is_transient  # noqa: E402
+
+
+class FakeHttpError(Exception):
+    """Shaped like googleapiclient's HttpError: the status is on resp"""
+
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.resp = type("Response", (), {"status": status})()
+
+
+def make_upstream(timeout=0.05, workers=2):
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_seconds=30)
+    return Upstream("test", UpstreamExecutor("test", max_workers=workers, max_queue=10), timeout=timeout,
+                    max_attempts=3, base_delay=0, max_delay=0, breaker=breaker)
+
+
+def test_timeout_is_transient_but_not_retryable():
+    error = UpstreamTimeout("gmail", 20)
+    assert error.status_code == 504
+    assert is_transient(error)
+    assert not is_retryable(error)
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_rate_limits_and_server_errors_are_retryable(status):
+    assert is_retryable(FakeHttpError(status))
+    wrapped = HTTPException(status_code=500, detail="Failed")
+    wrapped.__cause__ = FakeHttpError(status)
+    assert is_retryable(wrapped)
+
+
+@pytest.mark.parametrize("status", [400, 403, 404])
+def test_client_errors_are_not_retryable(status):
+    assert not is_transient(FakeHttpError(status))
+
+
+def test_non_idempotent_call_is_sent_once_after_a_timeout():
+    upstream = make_upstream()
+    calls = []
+
+    def send():
+        calls.append(1)
+        time.sleep(0.2)
+
+    with pytest.raises(UpstreamTimeout):
+        asyncio.run(upstream.call(send))
+    assert len(calls) == 1
+    assert upstream.retries == 0
+    assert upstream.breaker.consecutive_failures == 1
+
+
+def test_connection_errors_are_retryable():
+    assert is_retryable(ConnectionResetError("reset by peer"))
+
+
+@pytest.mark.parametrize("error", [IndexError("list index out of range"), RuntimeError("bug"), ValueError("bad")])
+def test_unknown_errors_are_not_transient(error):
+    wrapped = HTTPException(status_code=500, detail="Failed to create Google Form")
+    wrapped.__cause__ = error
+    assert not is_transient(wrapped)
+
+
+def test_bad_requests_do_not_open_the_breaker():
+    upstream = make_upstream()
+
+    def create():
+        raise IndexError("list index out of range")
+
+    for _ in range(upstream.breaker.failure_threshold + 1):
+        with pytest.raises(IndexError):
+            asyncio.run(upstream.call(create, idempotent=True))
+    assert upstream.breaker.state == "closed"
+    assert upstream.breaker.consecutive_failures == 0
+
+
+def test_time_queued_for_a_worker_does_not_count_towards_the_timeout():
+    upstream = make_upstream(timeout=0.15, workers=1)
+
+    async def run():
+        return await asyncio.gather(upstream.call(time.sleep, 0.1), upstream.call(time.sleep, 0.1))
+
+    asyncio.run(run())
+    assert upstream.timeouts == 0
+    assert upstream.breaker.consecutive_failures == 0
+
+
+def test_cancelled_probe_is_released():
+    upstream = make_upstream(timeout=1)
+    upstream.breaker.state = HALF_OPEN
+
+    async def run():
+        probe = asyncio.ensure_future(upstream.call(time.sleep, 0.2))
+        await asyncio.sleep(0.05)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(run())
+    # The next call is let through as the new probe
+    upstream.breaker.allow()